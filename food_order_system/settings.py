@@ -25,14 +25,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "orders.middleware.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Serve static files before the rest of the stack runs
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    # Inside the session middleware, so saving the session does not count as a write
+    "orders.middleware.ReplicaPinMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
 ROOT_URLCONF = "food_order_system.urls"
@@ -54,6 +58,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "food_order_system.wsgi.application"
+ASGI_APPLICATION = "food_order_system.asgi.application"
+
+# Route the order views to their async implementations (serve with an ASGI server)
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
 
 DATABASES = {
     "default": {
@@ -65,9 +73,89 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "password"),
         "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # Keep connections open between requests (seconds, 0 closes them after each
+        # request, "None" keeps them forever) and check them before reuse
+        "CONN_MAX_AGE": None
+        if os.environ.get("DB_CONN_MAX_AGE") == "None"
+        else int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": os.environ.get("DB_CONN_HEALTH_CHECKS", "True") == "True",
     }
 }
 
+# Connection pooling for PostgreSQL: "" (none), "psycopg" (in-process pool, needs
+# psycopg 3 with the pool extra) or "pgbouncer" (POSTGRES_HOST points at a pgbouncer
+# running in transaction pooling mode)
+DB_POOL = os.environ.get("DB_POOL", "")
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"]["OPTIONS"] = {
+        "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 5)),
+    }
+    if DB_POOL == "psycopg":
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }
+        # The pool owns the connections; Django must not keep them itself
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+    elif DB_POOL == "pgbouncer":
+        # Named cursors do not survive transaction pooling
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+# Read replicas: comma-separated hosts (database file names with SQLite) sharing the
+# default database's settings. orders.routers.ReplicaRouter sends menu and reporting
+# reads to them; tests run them as mirrors of the default database
+DATABASE_REPLICAS = []
+for number, location in enumerate(os.environ.get("DB_REPLICAS", "").split(","), 1):
+    if not location.strip():
+        continue
+    alias = f"replica_{number}"
+    key = "NAME" if DATABASES["default"]["ENGINE"].endswith("sqlite3") else "HOST"
+    DATABASES[alias] = dict(
+        DATABASES["default"], **{key: location.strip()}, TEST={"MIRROR": "default"}
+    )
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["orders.routers.ReplicaRouter"]
+# Seconds a client reads from the default database after writing, to see its own writes
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# The default cache is a directory shared by every process of the host, so menu and
+# user invalidations reach all workers; use Redis when running on several hosts
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+    }
+}
+
+# Tests run against a local memory cache of their own (see orders.testing.TestRunner)
+TEST_RUNNER = "orders.testing.TestRunner"
+
+# Sessions: "cached_db" (read from the cache, written through to the database),
+# "signed_cookies" (stored in the client, no server-side reads or writes), "cache"
+# or "db"
+SESSION_ENGINE = "django.contrib.sessions.backends." + os.environ.get(
+    "SESSION_BACKEND", "cached_db"
+)
+
+# Users and their customer details are cached for authenticated requests
+AUTHENTICATION_BACKENDS = [
+    "users.backends.CachedModelBackend",
+    # Keeps sessions created before the cached backend valid
+    "django.contrib.auth.backends.ModelBackend",
+]
+USER_CACHE_ALIAS = "default"
+USER_CACHE_TIMEOUT = int(os.environ.get("USER_CACHE_TIMEOUT", 3600))
+
+# Menu cache: a per-process LRU tier in front of the shared cache alias
+MENU_CACHE_ALIAS = "default"
+MENU_CACHE_TIMEOUT = int(os.environ.get("MENU_CACHE_TIMEOUT", 3600))
+MENU_LOCAL_CACHE_SIZE = 8
+# Seconds browsers, CDNs and proxies may serve the menu JSON endpoint without revalidating
+MENU_API_MAX_AGE = int(os.environ.get("MENU_API_MAX_AGE", 60))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -98,11 +186,51 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 
 MEDIA_ROOT = BASE_DIR / "static/uploads"
 
+# Widths of the resized copies generated for each menu image (served through srcset)
+MENU_IMAGE_WIDTHS = (120, 240, 480, 960)
+
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic minifies CSS/JS (when rcssmin/rjsmin are installed), hashes file names
+# and precompresses them with gzip and brotli. WhiteNoise serves hashed files with a
+# one-year immutable Cache-Control header; only the hashed copies are kept.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "food_order_system.storage.MinifiedManifestStaticFilesStorage"},
+}
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "orders.queries": {
+            "handlers": ["console"],
+            "level": os.environ.get("QUERY_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
 PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
+PAYPAL_CLIENT_SECRET = os.getenv("PAYPAL_CLIENT_SECRET")
 PAYPAL_CURRENCY = os.getenv("PAYPAL_CURRENCY")
+PAYPAL_API_URL = os.getenv("PAYPAL_API_URL", "https://api-m.sandbox.paypal.com")
+
+# Gateway verifying payments (orders.payments.FakePaymentGateway for local development)
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "orders.payments.PayPalGateway")
+
+# Kitchen display: how long a queue snapshot is kept, and how often streams check the queue for changes (seconds)
+KITCHEN_SNAPSHOT_TIMEOUT = 3600
+KITCHEN_POLL_INTERVAL = 1.0
+KITCHEN_HEARTBEAT_INTERVAL = 15.0
+
+# Threads running background jobs such as payment verification (0 runs them inline)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 4))
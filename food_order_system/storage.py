@@ -0,0 +1,78 @@
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Minifiers are optional: without them assets are hashed and compressed, but not minified
+try:
+    from rcssmin import cssmin
+except ImportError:
+    cssmin = None
+
+try:
+    from rjsmin import jsmin
+except ImportError:
+    jsmin = None
+
+
+def get_minifier(path):
+    """
+    Get the function minifying a static file, or None if the file is left as is.
+
+    Args:
+        path (str): The static file's path.
+
+    Returns:
+        callable: Takes and returns the file's text, or None.
+    """
+    if ".min." in path:
+        return None
+    if path.endswith(".css"):
+        return cssmin
+    if path.endswith(".js"):
+        return jsmin
+    return None
+
+
+class MinifyingSourceStorage:
+    """
+    Wraps the storage of a static files finder so that CSS and JS files are read back
+    minified. Everything but open() is delegated to the wrapped storage.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def open(self, path, mode="rb"):
+        minify = get_minifier(path)
+        if minify is None:
+            return self.storage.open(path, mode)
+        with self.storage.open(path, mode) as source:
+            content = minify(source.read().decode("utf-8"))
+        return ContentFile(content.encode("utf-8"), name=path)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Static files storage for production: collectstatic minifies CSS and JS, names every
+    file after a hash of its content, writes a manifest of the hashed names and stores
+    gzip and brotli copies next to them for WhiteNoise to serve.
+
+    Until collectstatic has written the manifest (development, tests) files are served
+    under their original names.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Minify before hashing, so the hash identifies the minified content
+        if not dry_run:
+            paths = {
+                name: (MinifyingSourceStorage(storage), path)
+                for name, (storage, path) in paths.items()
+            }
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
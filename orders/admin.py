@@ -1,10 +1,78 @@
 from django.contrib import admin
 
-from orders.models import Order, OrderDetails, Menu, MenuType
+from orders.models import (
+    Order,
+    OrderDetails,
+    OrderStateHistory,
+    Menu,
+    MenuType,
+    MenuSalesRollup,
+    MenuTypeSalesRollup,
+)
 
 # Register your models here.
 
-admin.site.register(Order)
+
+class OrderAdmin(admin.ModelAdmin):
+    """
+    Orders change state through Order.transition_to(), so the state is not editable here.
+    """
+
+    list_display = ("id", "customer", "date", "state")
+    list_filter = ("state",)
+    readonly_fields = ("state",)
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """
+    Admin for rows written by the application only, which staff may browse but not edit.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class OrderStateHistoryAdmin(ReadOnlyAdmin):
+    """
+    The order state history, which is only written by Order.transition_to().
+    """
+
+    list_display = ("order", "from_state", "to_state", "changed_by", "created")
+    list_filter = ("to_state",)
+
+
+class MenuSalesRollupAdmin(ReadOnlyAdmin):
+    """
+    Sales per menu item, read from the rollups maintained by orders.reporting.
+    """
+
+    list_display = ("period_start", "period", "menu", "orders", "servings", "revenue")
+    list_filter = ("period", "menu__type")
+    list_select_related = ("menu",)
+    date_hierarchy = "period_start"
+
+
+class MenuTypeSalesRollupAdmin(ReadOnlyAdmin):
+    """
+    Sales per menu type, read from the rollups maintained by orders.reporting.
+    """
+
+    list_display = ("period_start", "period", "menu_type", "orders", "servings", "revenue")
+    list_filter = ("period", "menu_type")
+    list_select_related = ("menu_type",)
+    date_hierarchy = "period_start"
+
+
+admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderDetails)
+admin.site.register(OrderStateHistory, OrderStateHistoryAdmin)
 admin.site.register(Menu)
 admin.site.register(MenuType)
+admin.site.register(MenuSalesRollup, MenuSalesRollupAdmin)
+admin.site.register(MenuTypeSalesRollup, MenuTypeSalesRollupAdmin)
@@ -0,0 +1,203 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+from orders.cart import MAX_CART_OPERATIONS, SessionCart, aget_open_order
+from orders.views import (
+    cart_action_operations,
+    cart_page_context,
+    cart_state,
+    cart_update_response,
+    json_body,
+    menu_etag,
+    menu_last_modified,
+    menu_page_context,
+    payment_response,
+)
+
+# Async implementations of the order views, routed instead of orders.views when
+# settings.ASYNC_VIEWS is enabled and the project is served by an ASGI server.
+# Queries use the async ORM; templates are rendered in a worker thread, where the
+# lazily loaded menu and request.user may still touch the database.
+
+arender = sync_to_async(render)
+
+
+async def load_user(request):
+    """
+    Load the authenticated user with the async API and keep it on the request,
+    so templates and sync helpers do not load it a second time.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def aget_cart(request):
+    """
+    Async counterpart of orders.cart.get_cart.
+    """
+    user = await load_user(request)
+    if user.is_authenticated:
+        return await aget_open_order(request)
+    return await sync_to_async(SessionCart)(request.session)
+
+
+def with_user(view):
+    """
+    Load request.user with the async API before a view and its inner decorators run,
+    so decorators calling sync functions of the request (e.g. condition) do not query
+    the database from the event loop.
+    """
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        await load_user(request)
+        return await view(request, *args, **kwargs)
+
+    return inner
+
+
+# Anonymous visitors post cart updates too, so they need the CSRF cookie
+@with_user
+@ensure_csrf_cookie
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
+@condition(etag_func=menu_etag, last_modified_func=menu_last_modified)
+async def menu(request):
+    """
+    Display the menu page, including menu items and the user's shopping cart information if authenticated.
+    Requests revalidating an unchanged page are answered with 304 Not Modified.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: Renders the 'orders/menu.html' template with the appropriate context.
+    """
+
+    return await arender(request, "orders/menu.html", menu_page_context())
+
+
+async def cartSummary(request):
+    """
+    Return the number of items and the total cost of the user's shopping cart, or of the
+    session cart of an anonymous visitor.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: JSON response with the cart item count and total.
+    """
+
+    cart = await aget_cart(request)
+    return JsonResponse(await sync_to_async(cart_state)(cart))
+
+
+@ensure_csrf_cookie
+async def cart(request):
+    """
+    Display the shopping cart of the user, or the session cart of an anonymous visitor.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: Renders the 'orders/cart.html' template with the appropriate context.
+    """
+
+    order = await aget_cart(request)
+    if isinstance(order, SessionCart):
+        items = await sync_to_async(order.lines)()
+    else:
+        await order.aload_cart_summary()
+        items = [item async for item in order.order_details.select_related("menu")]
+
+    return await arender(request, "orders/cart.html", cart_page_context(order, items))
+
+
+@login_required(login_url="signin")
+async def checkout(request):
+    """
+    Display the checkout page, including the user's shopping cart and order details.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: Renders the 'orders/checkout.html' template with the appropriate context.
+    """
+
+    await load_user(request)
+    order = await aget_open_order(request)
+    await order.aload_cart_summary()
+    items = [item async for item in order.order_details.select_related("menu")]
+
+    return await arender(request, "orders/checkout.html", cart_page_context(order, items))
+
+
+async def updateItem(request):
+    """
+    Handle updates to items in the shopping cart based on the provided action. Anonymous
+    visitors update their session cart.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing JSON data.
+
+    Returns:
+        JsonResponse: JSON response with the updated cart line and the new cart totals,
+        or status 400 if the body is not a JSON object with "dishId" and "action".
+    """
+    operations = cart_action_operations(json_body(request))
+    if operations is None:
+        return JsonResponse("Invalid cart action", status=400, safe=False)
+
+    order = await aget_cart(request)
+    return await sync_to_async(cart_update_response)(order, operations, single=True)
+
+
+async def updateItems(request):
+    """
+    Apply a batch of updates to items in the shopping cart in one transaction. Anonymous
+    visitors update their session cart.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing JSON data.
+
+    Returns:
+        JsonResponse: JSON response with every updated cart line and the new cart totals.
+    """
+    operations = json_body(request).get("operations")
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_CART_OPERATIONS:
+        return JsonResponse("Invalid cart operations", status=400, safe=False)
+
+    order = await aget_cart(request)
+    return await sync_to_async(cart_update_response)(order, operations)
+
+
+@login_required(login_url="signin")
+async def procesOrder(request):
+    """
+    Record the payment of the user's order and queue its verification.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing JSON data.
+
+    Returns:
+        JsonResponse: JSON response with the payment's idempotency key and status.
+    """
+    data = json_body(request)
+    reference = data.get("paymentId")
+    idempotency_key = data.get("idempotencyKey")
+    if not reference or not idempotency_key:
+        return JsonResponse("Missing payment details", status=400, safe=False)
+
+    order = await aget_open_order(request)
+    return await sync_to_async(payment_response)(order, reference, idempotency_key)
@@ -0,0 +1,277 @@
+import json
+import math
+import random
+import secrets
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.test import Client
+from django.urls import reverse
+from orders.cache import bump_menu_version
+from orders.middleware import QueryCounter
+from orders.models import Menu, MenuType, Order, OrderDetails
+
+BENCHMARK_PREFIX = "bench-"
+BENCHMARK_PASSWORD = "bench-password"
+
+
+def seed(menu_items, customers, max_lines, seed=0):
+    """
+    Create a benchmark catalog and customer population with open orders.
+
+    Every customer gets an open order with between 0 and `max_lines` dishes, and the
+    stored cart totals of the orders match their order details.
+
+    Args:
+        menu_items (int): The number of Menu rows to create.
+        customers (int): The number of users to create.
+        max_lines (int): The maximum number of dishes in an open order.
+        seed (int): Seed of the random generator, for reproducible populations.
+
+    Returns:
+        list: The created users.
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)
+
+    with transaction.atomic():
+        types = [
+            MenuType.objects.create(name=name, description=f"{BENCHMARK_PREFIX}{name}")
+            for name, label in MenuType.TYPE_CHOICES
+        ]
+        dishes = Menu.objects.bulk_create(
+            Menu(
+                name=f"{BENCHMARK_PREFIX}{index}",
+                price=Decimal(rng.randint(500, 6000)) / 100,
+                type=rng.choice(types),
+                ingredients="benchmark",
+                status="A" if rng.random() < 0.9 else "U",
+            )
+            for index in range(menu_items)
+        )
+        users = User.objects.bulk_create(
+            User(username=f"{BENCHMARK_PREFIX}{index}", password=password)
+            for index in range(customers)
+        )
+        orders = Order.objects.bulk_create(
+            Order(customer=user) for user in users
+        )
+
+        details = []
+        for order in orders:
+            for dish in rng.sample(dishes, rng.randint(0, min(max_lines, len(dishes)))):
+                servings = rng.randint(1, 4)
+                details.append(
+                    OrderDetails(order=order, menu=dish, no_of_serving=servings)
+                )
+                order.items_count += servings
+                order.total_amount += dish.price * servings
+        OrderDetails.objects.bulk_create(details, batch_size=1000)
+        Order.objects.bulk_update(orders, ["items_count", "total_amount"], batch_size=1000)
+
+    # bulk_create sends no signals, so invalidate the menu cache explicitly
+    bump_menu_version()
+    return users
+
+
+def cleanup():
+    """
+    Delete every row created by seed().
+    """
+    with transaction.atomic():
+        users = User.objects.filter(username__startswith=BENCHMARK_PREFIX)
+        orders = Order.objects.filter(customer__in=users)
+        OrderDetails.objects.filter(order__in=orders).delete()
+        orders.delete()
+        users.delete()
+        Menu.objects.filter(name__startswith=BENCHMARK_PREFIX).delete()
+        MenuType.objects.filter(description__startswith=BENCHMARK_PREFIX).delete()
+    bump_menu_version()
+
+
+def session_cookies(user):
+    """
+    Create a logged-in session for a user without going through the login view.
+
+    Returns:
+        dict: Cookies (session and CSRF) authenticating requests as the user.
+    """
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return {
+        settings.SESSION_COOKIE_NAME: session.session_key,
+        settings.CSRF_COOKIE_NAME: secrets.token_hex(16),
+    }
+
+
+class TestClientTransport:
+    """
+    Send requests through Django's test client, in the benchmarking process.
+    """
+
+    def __init__(self, cookies):
+        # Outside the test runner the host must be one of ALLOWED_HOSTS
+        host = next((host for host in settings.ALLOWED_HOSTS if host != "*"), "localhost")
+        self.client = Client(HTTP_HOST=host.lstrip("."), raise_request_exception=False)
+        for name, value in cookies.items():
+            self.client.cookies[name] = value
+
+    def request(self, method, path, payload=None):
+        counter = QueryCounter()
+        with connections["default"].execute_wrapper(counter):
+            if method == "POST":
+                response = self.client.post(
+                    path, json.dumps(payload), content_type="application/json"
+                )
+            else:
+                response = self.client.get(path)
+        return response.status_code, counter.count
+
+
+class HttpTransport:
+    """
+    Send requests to a running server. Query counts are read from the X-DB-Query-Count
+    header, which the server only sends with DEBUG enabled.
+    """
+
+    def __init__(self, base_url, cookies):
+        self.base_url = base_url.rstrip("/")
+        self.cookies = cookies
+
+    def request(self, method, path, payload=None):
+        headers = {
+            "Cookie": "; ".join(f"{name}={value}" for name, value in self.cookies.items()),
+            "X-CSRFToken": self.cookies[settings.CSRF_COOKIE_NAME],
+        }
+        data = None
+        if method == "POST":
+            data = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(
+            self.base_url + path, data=data, headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+                queries = response.headers.get("X-DB-Query-Count")
+        except urllib.error.HTTPError as error:
+            status = error.code
+            queries = error.headers.get("X-DB-Query-Count")
+        return status, int(queries) if queries is not None else None
+
+
+def scenario_request(name, rng, dish_ids):
+    """
+    Build the requests sent by one iteration of a scenario.
+
+    Returns:
+        tuple: The timed request and an untimed setup request sent before it (or None),
+        each as (HTTP method, path, JSON payload or None).
+    """
+    if name == "update_item":
+        payload = {"dishId": rng.choice(dish_ids), "action": rng.choice(["add", "remove"])}
+        return ("POST", reverse("update_item"), payload), None
+    if name == "proces_order":
+        # Paying completes the order, so fill the next cart first
+        setup = ("POST", reverse("update_item"), {"dishId": rng.choice(dish_ids), "action": "add"})
+        payload = {
+            "paymentId": f"{BENCHMARK_PREFIX}{rng.getrandbits(64):x}",
+            "idempotencyKey": f"{rng.getrandbits(128):032x}",
+        }
+        return ("POST", reverse("proces_order"), payload), setup
+    return ("GET", reverse(name), None), None
+
+
+SCENARIOS = ("menu", "cart", "update_item", "proces_order")
+
+
+def percentile(values, percent):
+    """
+    Get the nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def run_scenario(name, transports, concurrency, requests, seed=0):
+    """
+    Send `requests` requests of one scenario with `concurrency` parallel workers.
+
+    Each worker uses its own transport (and so its own logged-in user). With a
+    concurrency of 1 the requests run in the calling thread.
+
+    Args:
+        name (str): The scenario name, one of SCENARIOS.
+        transports (list): One transport per worker.
+        concurrency (int): The number of parallel workers.
+        requests (int): The total number of requests.
+        seed (int): Seed of the random generator choosing dishes and actions.
+
+    Returns:
+        dict: Latency percentiles (ms), throughput (requests/s), mean queries and errors.
+    """
+    dish_ids = list(
+        Menu.objects.filter(name__startswith=BENCHMARK_PREFIX, status="A").values_list(
+            "id", flat=True
+        )
+    )
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        transport = transports[index]
+        latencies, queries, errors = [], [], 0
+        for _ in range(requests // concurrency + (index < requests % concurrency)):
+            (method, path, payload), setup = scenario_request(name, rng, dish_ids)
+            if setup is not None:
+                transport.request(*setup)
+            start = time.perf_counter()
+            try:
+                status, count = transport.request(method, path, payload)
+            except Exception:
+                status, count = None, None
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+            if count is not None:
+                queries.append(count)
+        if concurrency > 1:
+            connections.close_all()
+        return latencies, queries, errors
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [worker(0)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for result in results for latency in result[0]]
+    queries = [count for result in results for count in result[1]]
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(result[2] for result in results),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": len(latencies) / elapsed if elapsed else None,
+        "mean_queries": sum(queries) / len(queries) if queries else None,
+    }
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from orders.models import Menu
+
+MENU_VERSION_KEY = "orders:menu:version"
+MENU_KEY = "orders:menu:available:{version}"
+MENU_MODIFIED_KEY = "orders:menu:modified"
+
+
+class LocalLRUCache:
+    """
+    Small thread-safe least-recently-used cache kept in the memory of a single process.
+
+    Attributes:
+        max_size (int): The maximum number of entries kept before the oldest is evicted.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalLRUCache(getattr(settings, "MENU_LOCAL_CACHE_SIZE", 8))
+
+
+def shared_cache():
+    """
+    Get the Django cache backend shared by all processes for menu data.
+    """
+    return caches[getattr(settings, "MENU_CACHE_ALIAS", "default")]
+
+
+def get_menu_version():
+    """
+    Get the current menu version, initializing it if the shared cache has none.
+
+    The initial value is a millisecond timestamp, so a version lost to eviction
+    never comes back with a number that older cached entries were stored under.
+    """
+    cache = shared_cache()
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def get_menu_modified():
+    """
+    Get when the menu last changed, as recorded by bump_menu_version().
+
+    If the shared cache lost the time, the current time is recorded instead, so
+    clients holding an older copy of the menu fetch it again.
+
+    Returns:
+        datetime: The aware time of the last change, to the second.
+    """
+    cache = shared_cache()
+    modified = cache.get(MENU_MODIFIED_KEY)
+    if modified is None:
+        cache.add(MENU_MODIFIED_KEY, int(time.time()), timeout=None)
+        modified = cache.get(MENU_MODIFIED_KEY)
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def bump_menu_version():
+    """
+    Invalidate every cached menu entry by moving to a new menu version, and record
+    the time of the change.
+    """
+    cache = shared_cache()
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.add(MENU_VERSION_KEY, int(time.time() * 1000), timeout=None)
+    cache.set(MENU_MODIFIED_KEY, int(time.time()), timeout=None)
+    local_cache.clear()
+
+
+def get_available_menu(version=None):
+    """
+    Get the available menu items ordered by type and price.
+
+    Lookups go through the per-process LRU cache, then the shared cache, and only
+    query the database when neither holds the current menu version.
+
+    Args:
+        version (int, optional): The menu version already read by the caller.
+
+    Returns:
+        list: Available Menu instances.
+    """
+    if version is None:
+        version = get_menu_version()
+    key = MENU_KEY.format(version=version)
+    menu = local_cache.get(key)
+    if menu is None:
+        cache = shared_cache()
+        menu = cache.get(key)
+        if menu is None:
+            # Read from the primary: a lagging replica would store the previous menu
+            # under the new version until it expires
+            menu = list(
+                Menu.objects.using(DEFAULT_DB_ALIAS)
+                .filter(status="A")
+                .select_related("type")
+                .order_by("type", "price")
+            )
+            cache.set(key, menu, getattr(settings, "MENU_CACHE_TIMEOUT", 3600))
+        local_cache.set(key, menu)
+    return menu
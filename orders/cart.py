@@ -0,0 +1,365 @@
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.utils.functional import cached_property
+from orders.cache import get_available_menu
+from orders.models import Menu, Order, OrderDetails
+
+MAX_CART_OPERATIONS = 100
+OPEN_ORDER_SESSION_KEY = "open_order_id"
+# Cart of an anonymous visitor: {"<dish id>": servings}
+SESSION_CART_KEY = "cart"
+
+
+class CartLocked(Exception):
+    """
+    Raised when the items of an order can no longer be changed, e.g. while it is being paid for.
+    """
+
+
+def get_open_order(request):
+    """
+    Get the open order (shopping cart) of the logged-in user, creating it if needed.
+
+    The order id is kept in the session, so after the first request the order is
+    loaded by primary key. Creation relies on the one-open-order-per-customer
+    constraint: a concurrent request that loses the race reads the winner's order.
+
+    Args:
+        request (HttpRequest): The HTTP request of an authenticated user.
+
+    Returns:
+        Order: The user's open order.
+    """
+    order_id = request.session.get(OPEN_ORDER_SESSION_KEY)
+    if order_id is not None:
+        order = Order.objects.filter(
+            pk=order_id, customer=request.user, state__in=Order.OPEN_STATES
+        ).first()
+        if order is not None:
+            return order
+
+    order = get_or_create_open_order(request.user)
+    request.session[OPEN_ORDER_SESSION_KEY] = order.pk
+    return order
+
+
+async def aget_open_order(request):
+    """
+    Async counterpart of get_open_order, using the async session and ORM APIs.
+
+    Args:
+        request (HttpRequest): The HTTP request of an authenticated user.
+
+    Returns:
+        Order: The user's open order.
+    """
+    user = await request.auser()
+    order_id = await request.session.aget(OPEN_ORDER_SESSION_KEY)
+    if order_id is not None:
+        order = await Order.objects.filter(
+            pk=order_id, customer=user, state__in=Order.OPEN_STATES
+        ).afirst()
+        if order is not None:
+            return order
+
+    order = await sync_to_async(get_or_create_open_order)(user)
+    await request.session.aset(OPEN_ORDER_SESSION_KEY, order.pk)
+    return order
+
+
+def get_or_create_open_order(user):
+    """
+    Get or create the open order of a user, tolerating a concurrent insert of the same order.
+
+    Args:
+        user (User): The customer.
+
+    Returns:
+        Order: The user's open order.
+    """
+    try:
+        with transaction.atomic():
+            order = Order.objects.filter(
+                customer=user, state__in=Order.OPEN_STATES
+            ).first()
+            if order is None:
+                order = Order.objects.create(customer=user)
+    except IntegrityError:
+        order = Order.objects.get(customer=user, state__in=Order.OPEN_STATES)
+    return order
+
+
+def resolve_quantity(current, operation):
+    """
+    Get the number of servings a cart line has after applying a single operation.
+
+    Args:
+        current (int): The number of servings before the operation.
+        operation (dict): Either {"dishId", "action"} with action "add", "remove" or
+            "delete", {"dishId", "quantity"} setting the number of servings directly, or
+            {"dishId", "increment"} adding a number of servings.
+
+    Returns:
+        int: The new number of servings, never below zero.
+    """
+    if "quantity" in operation:
+        quantity = int(operation["quantity"])
+    elif "increment" in operation:
+        quantity = current + int(operation["increment"])
+    elif operation.get("action") == "add":
+        quantity = current + 1
+    elif operation.get("action") == "remove":
+        quantity = current - 1
+    elif operation.get("action") == "delete":
+        quantity = 0
+    else:
+        raise ValueError(f"Unknown cart action: {operation.get('action')!r}")
+    return max(quantity, 0)
+
+
+def apply_cart_operations(order, operations):
+    """
+    Apply a batch of cart operations to an order in one transaction.
+
+    Operations are applied in order, so several clicks on the same dish accumulate.
+    New lines are inserted with bulk_create, changed lines saved with bulk_update and
+    emptied lines deleted with one query, then the stored cart totals are recomputed
+    from the lines with one aggregate UPDATE.
+
+    Args:
+        order (Order): The customer's open order.
+        operations (list): Cart operations as accepted by resolve_quantity.
+
+    Raises:
+        CartLocked: If the order is no longer in the cart state.
+        Menu.DoesNotExist: If an operation refers to a dish that does not exist.
+        ValueError: If an operation is malformed.
+
+    Returns:
+        list: One {"dishId", "quantity", "total"} dict per dish touched by the batch.
+    """
+    dish_ids = [int(operation["dishId"]) for operation in operations]
+    dishes = Menu.objects.in_bulk(set(dish_ids))
+    if len(dishes) != len(set(dish_ids)):
+        raise Menu.DoesNotExist("Dish does not exist")
+
+    with transaction.atomic():
+        # Concurrent batches on the same order queue up on its row, so a dish added by
+        # both is inserted by the first and updated by the second. The state is checked
+        # under the lock, as record_payment locks the row to leave the cart state
+        state = Order.objects.select_for_update().values_list("state", flat=True).get(
+            pk=order.pk
+        )
+        if state != Order.CART:
+            raise CartLocked("Order is awaiting payment")
+        lines = {
+            line.menu_id: line
+            for line in OrderDetails.objects.select_for_update().filter(
+                order=order, menu_id__in=dishes
+            )
+        }
+        previous = {dish_id: line.no_of_serving for dish_id, line in lines.items()}
+        quantities = dict(previous)
+        for dish_id, operation in zip(dish_ids, operations):
+            quantities[dish_id] = resolve_quantity(
+                quantities.get(dish_id, 0), operation
+            )
+
+        to_create, to_update, to_delete = [], [], []
+        for dish_id, quantity in quantities.items():
+            change = quantity - previous.get(dish_id, 0)
+            line = lines.get(dish_id)
+            if line is None:
+                if quantity > 0:
+                    to_create.append(
+                        OrderDetails(
+                            order=order, menu=dishes[dish_id], no_of_serving=quantity
+                        )
+                    )
+            elif quantity <= 0:
+                to_delete.append(line.pk)
+            elif change:
+                line.no_of_serving = quantity
+                to_update.append(line)
+
+        if to_create:
+            OrderDetails.objects.bulk_create(to_create)
+        if to_update:
+            OrderDetails.objects.bulk_update(to_update, ["no_of_serving"])
+        if to_delete:
+            OrderDetails.objects.filter(pk__in=to_delete).delete()
+        if to_create or to_update or to_delete:
+            order.sync_cart_totals()
+
+    return [
+        {
+            "dishId": dish_id,
+            "quantity": quantity,
+            "total": str(dishes[dish_id].price * quantity),
+        }
+        for dish_id, quantity in quantities.items()
+    ]
+
+
+class SessionCart:
+    """
+    Shopping cart of an anonymous visitor, kept in the session as a map of dish ids to
+    numbers of servings. Dishes and prices come from the cached menu, so browsing and
+    filling the cart touch neither the orders nor the menu tables; the cart is merged
+    into the visitor's open order when they sign in (see merge_session_cart).
+
+    Offers the cart attributes of Order used by the views and templates (items_count,
+    total_amount, cart_items, cart_total), so it can be rendered in place of an order.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.quantities = {
+            int(dish_id): quantity
+            for dish_id, quantity in session.get(SESSION_CART_KEY, {}).items()
+        }
+
+    @cached_property
+    def dishes(self):
+        """
+        Get the available dishes by id.
+        """
+        return {dish.pk: dish for dish in get_available_menu()}
+
+    def lines(self):
+        """
+        Get the cart lines as unsaved OrderDetails, skipping dishes no longer available.
+        """
+        return [
+            OrderDetails(menu=self.dishes[dish_id], no_of_serving=quantity)
+            for dish_id, quantity in self.quantities.items()
+            if dish_id in self.dishes
+        ]
+
+    @property
+    def items_count(self):
+        return sum(line.no_of_serving for line in self.lines())
+
+    @property
+    def total_amount(self):
+        return sum((line.total for line in self.lines()), Decimal("0.00"))
+
+    cart_items = items_count
+    cart_total = total_amount
+
+    def apply(self, operations):
+        """
+        Apply a batch of cart operations and store the cart in the session.
+
+        Args:
+            operations (list): Cart operations as accepted by resolve_quantity.
+
+        Raises:
+            Menu.DoesNotExist: If an operation refers to a dish that is not available.
+            ValueError: If an operation is malformed.
+
+        Returns:
+            list: One {"dishId", "quantity", "total"} dict per dish touched by the batch,
+            as returned by apply_cart_operations.
+        """
+        dish_ids = [int(operation["dishId"]) for operation in operations]
+        if not set(dish_ids) <= self.dishes.keys():
+            raise Menu.DoesNotExist("Dish does not exist")
+
+        touched = {}
+        for dish_id, operation in zip(dish_ids, operations):
+            touched[dish_id] = resolve_quantity(
+                self.quantities.get(dish_id, 0), operation
+            )
+            self.quantities[dish_id] = touched[dish_id]
+        self.quantities = {
+            dish_id: quantity for dish_id, quantity in self.quantities.items() if quantity
+        }
+        self.session[SESSION_CART_KEY] = {
+            str(dish_id): quantity for dish_id, quantity in self.quantities.items()
+        }
+
+        return [
+            {
+                "dishId": dish_id,
+                "quantity": quantity,
+                "total": str(self.dishes[dish_id].price * quantity),
+            }
+            for dish_id, quantity in touched.items()
+        ]
+
+
+def get_cart(request):
+    """
+    Get the cart of a request: the open order of a signed-in user, or the session cart
+    of an anonymous visitor.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        Order or SessionCart: The cart.
+    """
+    if request.user.is_authenticated:
+        return get_open_order(request)
+    return SessionCart(request.session)
+
+
+def update_cart(cart, operations):
+    """
+    Apply a batch of cart operations to a cart returned by get_cart().
+
+    Raises:
+        CartLocked: If the cart is an order that is no longer in the cart state.
+        Menu.DoesNotExist: If an operation refers to a dish that does not exist.
+        ValueError: If an operation is malformed.
+
+    Returns:
+        list: One {"dishId", "quantity", "total"} dict per dish touched by the batch.
+    """
+    if isinstance(cart, SessionCart):
+        return cart.apply(operations)
+    items = apply_cart_operations(cart, operations)
+    cart.refresh_from_db(fields=["items_count", "total_amount"])
+    return items
+
+
+def merge_session_cart(request, user):
+    """
+    Move the session cart of a visitor who just signed in into their open order.
+
+    All dishes are added with one batch of cart operations, so the merge costs a single
+    bulk insert and bulk update. Dishes deleted in the meantime are dropped. If the open
+    order is being paid for, the session cart is kept until the next sign-in.
+
+    Args:
+        request (HttpRequest): The sign-in or sign-up request.
+        user (User): The user who signed in.
+
+    Returns:
+        Order: The open order the cart was merged into, or None if there was nothing to
+        merge.
+    """
+    quantities = request.session.get(SESSION_CART_KEY)
+    if not quantities:
+        return None
+
+    existing = Menu.objects.filter(pk__in=[int(dish_id) for dish_id in quantities])
+    dish_ids = set(existing.values_list("pk", flat=True))
+    operations = [
+        {"dishId": int(dish_id), "increment": quantity}
+        for dish_id, quantity in quantities.items()
+        if int(dish_id) in dish_ids
+    ]
+
+    order = get_or_create_open_order(user)
+    if operations:
+        try:
+            apply_cart_operations(order, operations)
+        except CartLocked:
+            return None
+    del request.session[SESSION_CART_KEY]
+    request.session[OPEN_ORDER_SESSION_KEY] = order.pk
+    return order
@@ -0,0 +1,200 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from orders.cache import bump_menu_version
+from orders.models import Menu, MenuType
+
+# Menu fields a catalog sets; the image is optional and left alone when absent
+CATALOG_FIELDS = ("price", "ingredients", "status", "image")
+
+
+class CatalogError(Exception):
+    """
+    Raised when a menu catalog file cannot be read or holds invalid entries.
+    """
+
+
+class MenuDiff:
+    """
+    Changes needed to bring the menu in line with a catalog.
+
+    Attributes:
+        types (list): New MenuType rows to insert.
+        created (list): New Menu rows to insert.
+        updated (list): (Menu, changed field names) pairs to save.
+        disabled (list): Menu rows missing from the catalog, to mark unavailable.
+        unchanged (int): Number of catalog entries already matching the menu.
+    """
+
+    def __init__(self):
+        self.types = []
+        self.created = []
+        self.updated = []
+        self.disabled = []
+        self.unchanged = 0
+
+    def __bool__(self):
+        return bool(self.types or self.created or self.updated or self.disabled)
+
+
+def load_catalog(path, catalog_format=None):
+    """
+    Read menu entries from a CSV or JSON catalog file.
+
+    CSV files have a header row with the columns name, type, price, ingredients and
+    optionally status and image. JSON files hold a list of objects with the same keys,
+    or an object with that list under "items".
+
+    Args:
+        path (str): The catalog file.
+        catalog_format (str, optional): "csv" or "json"; defaults to the file extension.
+
+    Raises:
+        CatalogError: If the file cannot be opened or parsed.
+
+    Returns:
+        list: One dict per catalog entry.
+    """
+    catalog_format = catalog_format or Path(path).suffix.lstrip(".").lower()
+    try:
+        with open(path, newline="", encoding="utf-8") as catalog:
+            if catalog_format == "csv":
+                return list(csv.DictReader(catalog))
+            if catalog_format == "json":
+                entries = json.load(catalog)
+                return entries["items"] if isinstance(entries, dict) else entries
+    except (OSError, KeyError, ValueError, csv.Error) as error:
+        raise CatalogError(f"Cannot read {path}: {error}") from error
+    raise CatalogError(f"Unknown catalog format: {catalog_format!r}")
+
+
+def clean_entry(number, entry):
+    """
+    Validate a catalog entry and convert its values to model field values.
+
+    Args:
+        number (int): The entry's position in the catalog, for error messages.
+        entry (dict): The raw entry.
+
+    Raises:
+        CatalogError: If a field is missing or invalid.
+
+    Returns:
+        dict: The entry's name, type and the fields in CATALOG_FIELDS it sets.
+    """
+    try:
+        cleaned = {
+            "name": str(entry["name"]).strip(),
+            "type": str(entry["type"]).strip(),
+            "price": Decimal(str(entry["price"])),
+            "ingredients": str(entry["ingredients"]).strip(),
+            "status": str(entry.get("status") or "A").strip(),
+        }
+    except KeyError as error:
+        raise CatalogError(f"Entry {number}: missing {error.args[0]}") from error
+    except InvalidOperation as error:
+        raise CatalogError(f"Entry {number}: invalid price {entry['price']!r}") from error
+    if entry.get("image"):
+        cleaned["image"] = str(entry["image"]).strip()
+
+    try:
+        MenuType(name=cleaned["type"]).clean_fields(exclude=["description"])
+        fields = {name: value for name, value in cleaned.items() if name != "type"}
+        Menu(**fields).clean_fields(exclude=["type", "image"])
+    except ValidationError as error:
+        raise CatalogError(f"Entry {number} ({cleaned['name']}): {error}") from error
+    return cleaned
+
+
+def diff_menu(entries, disable_missing=True):
+    """
+    Compare catalog entries with the current menu, matching menu items by name.
+
+    Args:
+        entries (list): Raw catalog entries, see load_catalog().
+        disable_missing (bool): Mark menu items missing from the catalog unavailable.
+
+    Raises:
+        CatalogError: If an entry is invalid, or a name appears twice in the catalog
+            or in the menu.
+
+    Returns:
+        MenuDiff: The changes to apply.
+    """
+    cleaned = [clean_entry(number, entry) for number, entry in enumerate(entries, 1)]
+    names = [entry["name"] for entry in cleaned]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise CatalogError(f"Duplicate names in catalog: {', '.join(duplicates)}")
+
+    menu = {}
+    for item in Menu.objects.select_related("type"):
+        if item.name in menu:
+            raise CatalogError(f"Duplicate menu item in database: {item.name}")
+        menu[item.name] = item
+
+    diff = MenuDiff()
+    types = {menu_type.name: menu_type for menu_type in MenuType.objects.all()}
+    for entry in cleaned:
+        if entry["type"] not in types:
+            types[entry["type"]] = MenuType(name=entry["type"])
+            diff.types.append(types[entry["type"]])
+        menu_type = types[entry["type"]]
+
+        item = menu.get(entry["name"])
+        if item is None:
+            fields = {name: entry[name] for name in CATALOG_FIELDS if name in entry}
+            diff.created.append(Menu(name=entry["name"], type=menu_type, **fields))
+            continue
+
+        changed = [
+            name
+            for name in CATALOG_FIELDS
+            if name in entry and getattr(item, name) != entry[name]
+        ]
+        if item.type.name != menu_type.name:
+            changed.append("type")
+        for name in changed:
+            setattr(item, name, menu_type if name == "type" else entry[name])
+        if changed:
+            diff.updated.append((item, changed))
+        else:
+            diff.unchanged += 1
+
+    if disable_missing:
+        catalog_names = set(names)
+        for item in menu.values():
+            if item.name not in catalog_names and item.status != "U":
+                item.status = "U"
+                diff.disabled.append(item)
+    return diff
+
+
+def apply_menu_diff(diff):
+    """
+    Save a menu diff with bulk queries in one transaction, then move to a new menu
+    version once, so the menu caches are rebuilt a single time.
+
+    Args:
+        diff (MenuDiff): The changes, see diff_menu().
+    """
+    if not diff:
+        return
+
+    with transaction.atomic():
+        MenuType.objects.bulk_create(diff.types)
+        Menu.objects.bulk_create(diff.created)
+
+        fields = sorted({name for item, changed in diff.updated for name in changed})
+        if fields:
+            Menu.objects.bulk_update([item for item, changed in diff.updated], fields)
+        if diff.disabled:
+            Menu.objects.filter(pk__in=[item.pk for item in diff.disabled]).update(
+                status="U"
+            )
+        # bulk_create and bulk_update send no model signals, so invalidate once here
+        transaction.on_commit(bump_menu_version)
@@ -0,0 +1,137 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.checks import Error, Tags, Warning, register
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+# {% static 'path' %} with a literal path
+STATIC_TAG = re.compile(r"""{%\s*static\s+(['"])(?P<path>[^'"]+)\1""")
+# src/href attributes pointing at STATIC_URL directly, bypassing the manifest
+HARDCODED_STATIC = re.compile(r"""(?:src|href)\s*=\s*['"]/?static/""")
+
+
+def template_files():
+    """
+    Get the paths of all templates of the Django template engines.
+    """
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in engine.template_dirs:
+            yield from sorted(Path(directory).rglob("*.html"))
+
+
+@register(Tags.templates)
+def check_static_references(app_configs, **kwargs):
+    """
+    Check that templates load static files through {% static %} with paths that exist,
+    so every asset is served under its hashed, long-cached name.
+    """
+    errors = []
+    for template in template_files():
+        source = template.read_text(encoding="utf-8")
+        for match in STATIC_TAG.finditer(source):
+            path = match.group("path")
+            if path.startswith("/"):
+                errors.append(
+                    Error(
+                        f"{template}: static path {path!r} starts with a slash.",
+                        hint="Static paths are relative to STATIC_URL; remove the leading slash.",
+                        id="orders.E001",
+                    )
+                )
+            elif not finders.find(path):
+                errors.append(
+                    Error(
+                        f"{template}: static file {path!r} does not exist.",
+                        id="orders.E002",
+                    )
+                )
+        if HARDCODED_STATIC.search(source):
+            errors.append(
+                Warning(
+                    f"{template}: static file referenced without {{% static %}}.",
+                    hint="Use {% static %} so the hashed file name is served.",
+                    id="orders.W001",
+                )
+            )
+    return errors
+
+
+@register(Tags.staticfiles, deploy=True)
+def check_static_manifest(app_configs, **kwargs):
+    """
+    Check that collectstatic has written the manifest of hashed static file names.
+    """
+    manifest_storage = getattr(staticfiles_storage, "manifest_storage", None)
+    if settings.DEBUG or manifest_storage is None:
+        return []
+    if not manifest_storage.exists(staticfiles_storage.manifest_name):
+        return [
+            Warning(
+                "The static files manifest is missing, so assets are served "
+                "without hashed names.",
+                hint="Run 'python manage.py collectstatic' when deploying.",
+                id="orders.W002",
+            )
+        ]
+    return []
+
+
+@register("connections")
+def check_database_connections(app_configs, **kwargs):
+    """
+    Check that connection persistence and pooling settings fit together.
+    """
+    messages = []
+    config = settings.DATABASES["default"]
+    postgres = config["ENGINE"] == "django.db.backends.postgresql"
+    if settings.DB_POOL not in ("", "psycopg", "pgbouncer"):
+        messages.append(
+            Error(
+                f"Unknown DB_POOL {settings.DB_POOL!r}.",
+                hint="Use 'psycopg', 'pgbouncer' or leave it empty.",
+                id="orders.E003",
+            )
+        )
+    elif settings.DB_POOL and not postgres:
+        messages.append(
+            Warning(
+                f"DB_POOL={settings.DB_POOL} is ignored by {config['ENGINE']}.",
+                id="orders.W003",
+            )
+        )
+    persistent = config["CONN_MAX_AGE"] != 0
+    if settings.ASYNC_VIEWS and persistent and settings.DB_POOL != "psycopg":
+        messages.append(
+            Warning(
+                "Persistent connections are not reused by async views, where every "
+                "request runs its queries in a new thread.",
+                hint="Set DB_CONN_MAX_AGE=0 and use DB_POOL=psycopg or pgbouncer.",
+                id="orders.W004",
+            )
+        )
+    return messages
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Check that the cache is shared between processes, as the menu version and the
+    cached users are invalidated through it.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if not settings.DEBUG and backend.endswith("LocMemCache"):
+        return [
+            Error(
+                "The local memory cache is not shared between processes, so workers "
+                "keep serving stale menus and users.",
+                hint="Use FileBasedCache (the default) or RedisCache for CACHE_BACKEND.",
+                id="orders.E004",
+            )
+        ]
+    return []
@@ -0,0 +1,150 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from orders.models import Order, OrderDetails
+from orders.routers import replica_alias
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Columns of an export, one row per order line
+EXPORT_FIELDS = (
+    "order",
+    "transaction",
+    "state",
+    "date",
+    "username",
+    "email",
+    "phone_number",
+    "postal_code",
+    "city",
+    "street",
+    "number",
+    "dish",
+    "menu_type",
+    "servings",
+    "price",
+    "total",
+)
+
+
+def export_range(start=None, end=None):
+    """
+    Turn an inclusive range of days into the aware datetimes bounding it.
+
+    Args:
+        start (date, optional): The first day.
+        end (date, optional): The last day.
+
+    Returns:
+        tuple: The start of the first day and the start of the day after the last day,
+        either of which is None when the bound is not given.
+    """
+    if start is not None:
+        start = timezone.make_aware(datetime.combine(start, time.min))
+    if end is not None:
+        end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    return start, end
+
+
+def export_queryset(start=None, end=None):
+    """
+    Get the order lines of all paid or cancelled orders, oldest order first.
+
+    Orders, customers and dishes are joined in the same query, so the lines can be
+    streamed in chunks without further queries. The query runs on a read replica when
+    one is configured.
+
+    Args:
+        start (datetime, optional): Only export orders placed from this moment.
+        end (datetime, optional): Only export orders placed before this moment.
+
+    Returns:
+        QuerySet: The order lines to export.
+    """
+    lines = OrderDetails.objects.using(replica_alias()).filter(
+        order__state__in=Order.SOLD_STATES + (Order.CANCELLED,)
+    )
+    if start is not None:
+        lines = lines.filter(order__date__gte=start)
+    if end is not None:
+        lines = lines.filter(order__date__lt=end)
+    return lines.select_related(
+        "order__customer__customer", "menu__type"
+    ).order_by("order__date", "order_id", "pk")
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Serialize order lines one at a time, reading them from the database in chunks.
+
+    Args:
+        queryset (QuerySet): Order lines, see export_queryset().
+        chunk_size (int): Number of rows fetched per round trip (a server-side cursor
+            is used where the database supports it).
+
+    Yields:
+        dict: One row per order line, keyed by EXPORT_FIELDS.
+    """
+    for line in queryset.iterator(chunk_size=chunk_size):
+        order = line.order
+        user = order.customer
+        customer = getattr(user, "customer", None) if user else None
+        price = line.amount
+        if price is None and line.menu:
+            price = line.menu.price
+        yield {
+            "order": order.pk,
+            "transaction": order.transaction or "",
+            "state": order.state,
+            "date": order.date.isoformat(),
+            "username": user.username if user else "",
+            "email": user.email if user else "",
+            "phone_number": customer.phone_number if customer else "",
+            "postal_code": customer.postal_code if customer else "",
+            "city": customer.city if customer else "",
+            "street": customer.street if customer else "",
+            "number": customer.number if customer else "",
+            "dish": line.menu.name if line.menu else "",
+            "menu_type": line.menu.type.name if line.menu else "",
+            "servings": line.no_of_serving,
+            "price": price,
+            "total": price * line.no_of_serving if price is not None else None,
+        }
+
+
+class Echo:
+    """
+    File-like object handing back what is written to it, so csv.writer can produce
+    lines for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    Format export rows as CSV, starting with a header line.
+    """
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writerow(dict(zip(EXPORT_FIELDS, EXPORT_FIELDS)))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    """
+    Format export rows as JSON Lines, one JSON object per line.
+    """
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+# Line formatter and content type of each export format
+EXPORT_FORMATS = {
+    "csv": (csv_lines, "text/csv"),
+    "jsonl": (jsonl_lines, "application/x-ndjson"),
+}
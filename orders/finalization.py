@@ -0,0 +1,107 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from orders.models import Order, OrderDetails
+
+FINALIZATION_KEY = "orders:finalized:{key}"
+FINALIZATION_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class OrderFinalizationError(Exception):
+    """
+    Raised when an order cannot be finalized (already finalized under another key, no
+    longer open, or its total differs from the amount paid).
+    """
+
+
+def generate_transaction_id():
+    """
+    Generate a collision-free transaction ID for a finalized order.
+    """
+    return uuid.uuid4().hex
+
+
+def finalization_result(order):
+    """
+    Serialize the outcome of finalizing an order.
+
+    Args:
+        order (Order): The finalized order.
+
+    Returns:
+        dict: The order id, transaction ID, number of items and total.
+    """
+    return {
+        "order": order.pk,
+        "transaction": order.transaction,
+        "items": order.items_count,
+        "total": str(order.total_amount),
+    }
+
+
+def finalize_order(order_id, idempotency_key, expected_total=None):
+    """
+    Mark an order as paid, exactly once.
+
+    The order row is locked for the duration of the finalization, each order line's
+    amount is frozen from the current menu price, the order gets a new transaction ID
+    and moves to the paid state.
+    Repeated calls with the same idempotency key return the result of the first call.
+
+    Args:
+        order_id (int): The order to finalize.
+        idempotency_key (str): Key identifying the payment that finalizes the order.
+        expected_total (Decimal, optional): The amount paid; finalization fails if the
+            order's total differs.
+
+    Raises:
+        OrderFinalizationError: If the order was finalized with another key, is no longer
+            open, or its total does not match expected_total.
+
+    Returns:
+        dict: The finalization result, see finalization_result().
+    """
+    cache_key = FINALIZATION_KEY.format(key=idempotency_key)
+    result = cache.get(cache_key)
+    if result is not None and result["order"] == order_id:
+        return result
+
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+
+        if order.finalization_key is not None:
+            if order.finalization_key != idempotency_key:
+                raise OrderFinalizationError("Order was already finalized")
+        elif order.state not in Order.OPEN_STATES:
+            raise OrderFinalizationError("Order is not awaiting payment")
+        else:
+            lines = list(
+                order.order_details.select_related("menu").select_for_update(of=("self",))
+            )
+            for line in lines:
+                line.amount = line.menu.price
+            total = sum(line.amount * line.no_of_serving for line in lines)
+            if expected_total is not None and total != expected_total:
+                raise OrderFinalizationError("Order total does not match the amount paid")
+
+            OrderDetails.objects.bulk_update(lines, ["amount"])
+            if order.state == Order.CART:
+                order.transition_to(Order.PENDING_PAYMENT)
+            order.transaction = generate_transaction_id()
+            order.finalization_key = idempotency_key
+            order.items_count = sum(line.no_of_serving for line in lines)
+            order.total_amount = total
+            order.save(
+                update_fields=[
+                    "transaction",
+                    "finalization_key",
+                    "items_count",
+                    "total_amount",
+                ]
+            )
+            order.transition_to(Order.PAID)
+        result = finalization_result(order)
+
+    cache.set(cache_key, result, FINALIZATION_CACHE_TIMEOUT)
+    return result
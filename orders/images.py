@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+from orders.cache import bump_menu_version
+from orders.models import Menu
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIRECTORY = "thumbnails"
+
+# Pillow save options per variant format; AVIF needs a Pillow built with libavif
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "avif": ("AVIF", {"quality": 60}),
+}
+
+
+def variant_formats():
+    """
+    Get the modern formats this Pillow build can encode, in order of preference.
+    """
+    return [name for name in VARIANT_FORMATS if features.check(name)]
+
+
+def variant_name(name, digest, width, extension):
+    """
+    Get the storage name of a resized variant of an image.
+
+    The name holds a hash of the original's content, so a new upload never takes over
+    the names (and cached URLs) of an earlier image's variants, even one stored under
+    the same name.
+
+    Args:
+        name (str): The storage name of the original image.
+        digest (str): The content hash of the original image.
+        width (int): The width of the variant.
+        extension (str): The file extension of the variant.
+
+    Returns:
+        str: E.g. "thumbnails/pizza-0cc175b9c0f1-320.webp" for "pizza.jpg".
+    """
+    stem = posixpath.splitext(name)[0]
+    return posixpath.join(VARIANTS_DIRECTORY, f"{stem}-{digest[:12]}-{width}.{extension}")
+
+
+def variant_names(variants):
+    """
+    Get the storage names of the variants listed by generate_image_variants().
+    """
+    return {
+        name
+        for key, entries in variants.items()
+        if key != "source"
+        for width, name in entries
+    }
+
+
+def delete_variants(storage, names):
+    """
+    Delete stored variants, ignoring those already gone.
+    """
+    for name in names:
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def save_variant(storage, image, name, image_format, options):
+    """
+    Encode an image and store it under a name, replacing an earlier file of that name.
+    """
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_image_variants(image_field, widths=None):
+    """
+    Generate resized copies of an image, in its own format and as WebP (and AVIF where
+    supported), for use in srcset attributes.
+
+    Images are never upscaled: widths above the original's width are skipped, and an
+    image narrower than every width gets a single variant at its own size.
+
+    Args:
+        image_field (ImageFieldFile): The uploaded image.
+        widths (iterable, optional): The variant widths; defaults to settings.MENU_IMAGE_WIDTHS.
+
+    Returns:
+        dict: The original's name under "source", and for "fallback" and each modern
+        format a list of [width, storage name] pairs, narrowest first.
+    """
+    storage = image_field.storage
+    with storage.open(image_field.name) as original:
+        content = original.read()
+    digest = hashlib.md5(content, usedforsecurity=False).hexdigest()
+    image = Image.open(BytesIO(content))
+    image.load()
+    image = ImageOps.exif_transpose(image)
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    # Browsers without WebP/AVIF support get a JPEG, or a PNG to keep transparency
+    if has_alpha:
+        fallback = ("PNG", "png", {"optimize": True})
+    else:
+        fallback = ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True})
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    widths = sorted(widths or settings.MENU_IMAGE_WIDTHS)
+    widths = [width for width in widths if width <= image.width] or [image.width]
+    formats = variant_formats()
+
+    variants = {"source": image_field.name, "fallback": []}
+    variants.update({name: [] for name in formats})
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+
+        image_format, extension, options = fallback
+        name = save_variant(
+            storage,
+            resized,
+            variant_name(image_field.name, digest, width, extension),
+            image_format,
+            options,
+        )
+        variants["fallback"].append([width, name])
+        for format_name in formats:
+            image_format, options = VARIANT_FORMATS[format_name]
+            name = save_variant(
+                storage,
+                resized,
+                variant_name(image_field.name, digest, width, format_name),
+                image_format,
+                options,
+            )
+            variants[format_name].append([width, name])
+    return variants
+
+
+def process_menu_image(menu_id):
+    """
+    Generate the image variants of a menu item and store their names on it.
+
+    The names are only stored if the item still has the image that was processed, so a
+    newer upload is never overwritten by an older one. The variants of the replaced
+    image (or of a removed one) are deleted, and menu caches move to a new version so
+    pages pick up the new variants.
+
+    Args:
+        menu_id (int): The menu item.
+
+    Returns:
+        bool: Whether variants were stored.
+    """
+    item = Menu.objects.filter(pk=menu_id).first()
+    if item is None:
+        return False
+    variants = {}
+    if item.image:
+        try:
+            variants = generate_image_variants(item.image)
+        except (OSError, Image.DecompressionBombError):
+            logger.warning("Cannot generate variants of %s", item.image.name, exc_info=True)
+            return False
+
+    with transaction.atomic():
+        # Read the replaced variants under the row lock, so uploads processed
+        # concurrently cannot miss the variants stored in between
+        row = (
+            Menu.objects.select_for_update()
+            .filter(pk=menu_id)
+            .values_list("image", "image_variants")
+            .first()
+        )
+        stored = row is not None and (row[0] or "") == (item.image.name or "")
+        if stored:
+            Menu.objects.filter(pk=menu_id).update(image_variants=variants)
+
+    previous = variant_names(row[1]) if row is not None else set()
+    new = variant_names(variants)
+    # The variants of the replaced image, or these ones if a newer upload won
+    delete_variants(item.image.storage, previous - new if stored else new - previous)
+    if stored and variants:
+        bump_menu_version()
+        return True
+    return False
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from orders.models import Order, OrderDetails
+
+KITCHEN_VERSION_KEY = "orders:kitchen:version"
+KITCHEN_SNAPSHOT_KEY = "orders:kitchen:snapshot:{version}"
+
+
+def get_kitchen_version():
+    """
+    Get the current version of the kitchen queue, initializing it if the cache has none.
+    """
+    version = cache.get(KITCHEN_VERSION_KEY)
+    if version is None:
+        cache.add(KITCHEN_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(KITCHEN_VERSION_KEY)
+    return version
+
+
+def bump_kitchen_version():
+    """
+    Signal connected kitchen screens that the queue changed.
+    """
+    try:
+        cache.incr(KITCHEN_VERSION_KEY)
+    except ValueError:
+        cache.add(KITCHEN_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def kitchen_queue():
+    """
+    Get the paid orders the kitchen has not handed over yet, oldest first, with their
+    order lines and dishes loaded in two extra queries.
+    """
+    return (
+        Order.objects.filter(state__in=Order.KITCHEN_STATES)
+        .select_related("customer")
+        .prefetch_related(
+            Prefetch(
+                "order_details",
+                queryset=OrderDetails.objects.select_related("menu").order_by("pk"),
+            )
+        )
+        .order_by("date")
+    )
+
+
+def kitchen_snapshot(version=None):
+    """
+    Serialize the kitchen queue, cached per queue version so that any number of
+    screens cost one set of queries per change.
+
+    Args:
+        version (int, optional): The queue version already read by the caller.
+
+    Returns:
+        list: One dict per order with its id, transaction, state, customer, date and lines.
+    """
+    if version is None:
+        version = get_kitchen_version()
+    key = KITCHEN_SNAPSHOT_KEY.format(version=version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = [
+            {
+                "order": order.pk,
+                "transaction": order.transaction,
+                "state": order.state,
+                "customer": str(order.customer) if order.customer else "",
+                "date": order.date.isoformat(),
+                "items": [
+                    {"dish": line.menu.name if line.menu else "", "servings": line.no_of_serving}
+                    for line in order.order_details.all()
+                ],
+            }
+            for order in kitchen_queue()
+        ]
+        cache.set(key, snapshot, settings.KITCHEN_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def poll_kitchen(last_version, idle):
+    """
+    Check the kitchen queue once for a Server-Sent Events stream.
+
+    The database is queried (once, through the snapshot cache) only when the queue
+    version moved since the last event.
+
+    Args:
+        last_version (str): The version of the last event sent, or the Last-Event-ID
+            of a reconnecting screen.
+        idle (float): Seconds since the last event was sent.
+
+    Returns:
+        tuple: The event to send (None if there is nothing to send), and the stream's
+        new last version and idle time.
+    """
+    version = get_kitchen_version()
+    if str(version) != str(last_version):
+        snapshot = kitchen_snapshot(version)
+        return f"id: {version}\nevent: queue\ndata: {json.dumps(snapshot)}\n\n", version, 0.0
+    if idle >= settings.KITCHEN_HEARTBEAT_INTERVAL:
+        # Comment line keeping proxies from closing an idle connection
+        return ": heartbeat\n\n", last_version, 0.0
+    return None, last_version, idle
+
+
+def kitchen_events(last_version=None):
+    """
+    Yield the kitchen queue as Server-Sent Events whenever it changes, for WSGI servers.
+    The stream holds a worker thread for as long as the screen is connected.
+
+    Args:
+        last_version (str, optional): The Last-Event-ID sent by a reconnecting screen.
+    """
+    idle = 0.0
+    while True:
+        event, last_version, idle = poll_kitchen(last_version, idle)
+        if event is not None:
+            yield event
+        time.sleep(settings.KITCHEN_POLL_INTERVAL)
+        idle += settings.KITCHEN_POLL_INTERVAL
+
+
+async def akitchen_events(last_version=None):
+    """
+    Async counterpart of kitchen_events for ASGI servers, where connected screens only
+    hold a coroutine each.
+
+    Args:
+        last_version (str, optional): The Last-Event-ID sent by a reconnecting screen.
+    """
+    idle = 0.0
+    while True:
+        event, last_version, idle = await sync_to_async(poll_kitchen)(last_version, idle)
+        if event is not None:
+            yield event
+        await asyncio.sleep(settings.KITCHEN_POLL_INTERVAL)
+        idle += settings.KITCHEN_POLL_INTERVAL
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from orders import workers
+from orders.images import process_menu_image
+from orders.models import Menu
+
+
+class Command(BaseCommand):
+    """
+    Generate the resized image copies of menu items uploaded before the image pipeline
+    existed, or imported without it (e.g. by sync_menu).
+    """
+
+    help = "Generate resized WebP/AVIF copies of menu images that have none yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of images processed in parallel (1 processes them in this thread).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate the copies of every image, e.g. after changing MENU_IMAGE_WIDTHS.",
+        )
+
+    def handle(self, *args, **options):
+        items = Menu.objects.exclude(Q(image="") | Q(image__isnull=True))
+        if not options["force"]:
+            # Without variants, or with variants of an earlier image
+            items = [
+                pk
+                for pk, image, variants in items.values_list("pk", "image", "image_variants")
+                if variants.get("source") != image
+            ]
+        else:
+            items = list(items.values_list("pk", flat=True))
+
+        if options["workers"] > 1:
+            # Resizing and encoding release the GIL, so threads use several cores
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                results = list(pool.map(self.process, items))
+        else:
+            results = [process_menu_image(pk) for pk in items]
+
+        self.stdout.write(
+            f"Generated variants for {sum(results)} of {len(items)} menu images."
+        )
+
+    def process(self, menu_id):
+        return bool(workers.run_job(process_menu_image, menu_id))
@@ -0,0 +1,157 @@
+import json
+from contextlib import nullcontext
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from orders import benchmark
+
+
+class Command(BaseCommand):
+    """
+    Seed a benchmark population and measure the ordering flow at increasing concurrency.
+    """
+
+    help = (
+        "Seed benchmark menu items and customers, then report latency percentiles, "
+        "throughput and query counts of the ordering views. Writes to the configured "
+        "database, so run it against a dedicated benchmark database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--menu-items", type=int, default=2000)
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument(
+            "--max-lines",
+            type=int,
+            default=10,
+            help="Maximum number of dishes in a seeded open order.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            default="1,4,16",
+            help="Comma-separated concurrency levels.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per scenario and concurrency level.",
+        )
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(benchmark.SCENARIOS),
+            help="Comma-separated scenarios to run.",
+        )
+        parser.add_argument(
+            "--url",
+            help="Benchmark a running server (e.g. http://localhost:8000) instead of the test client.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded rows instead of deleting them afterwards.",
+        )
+        parser.add_argument(
+            "--reuse",
+            action="store_true",
+            help="Reuse rows kept by an earlier run instead of seeding.",
+        )
+        parser.add_argument("--json", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options["concurrency"].split(",")]
+        scenarios = options["scenarios"].split(",")
+        unknown = set(scenarios) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        if options["reuse"]:
+            users = list(
+                User.objects.filter(username__startswith=benchmark.BENCHMARK_PREFIX)
+            )
+            if not users:
+                raise CommandError("No benchmark rows to reuse, run without --reuse.")
+        else:
+            if User.objects.filter(
+                username__startswith=benchmark.BENCHMARK_PREFIX
+            ).exists():
+                raise CommandError(
+                    "Benchmark rows already exist, pass --reuse or delete them first."
+                )
+            self.stdout.write(
+                f"Seeding {options['menu_items']} menu items and "
+                f"{options['customers']} customers on {connection.vendor}..."
+            )
+            users = benchmark.seed(
+                options["menu_items"],
+                options["customers"],
+                options["max_lines"],
+                options["seed"],
+            )
+
+        # In-process runs verify payments inline against the fake gateway, so the
+        # proces_order scenario stays offline; a running server uses its own settings
+        offline = nullcontext() if options["url"] else override_settings(
+            PAYMENT_GATEWAY="orders.payments.FakePaymentGateway",
+            BACKGROUND_WORKERS=0,
+        )
+        results = []
+        try:
+            with offline:
+                for scenario in scenarios:
+                    for level in levels:
+                        transports = [
+                            self.transport(users[index % len(users)], options["url"])
+                            for index in range(level)
+                        ]
+                        result = benchmark.run_scenario(
+                            scenario,
+                            transports,
+                            level,
+                            options["requests"],
+                            options["seed"],
+                        )
+                        result["database"] = connection.vendor
+                        results.append(result)
+                        self.stdout.write(self.format_result(result))
+        finally:
+            if not options["keep"]:
+                benchmark.cleanup()
+
+        if options["json"]:
+            with open(options["json"], "w") as file:
+                json.dump(results, file, indent=2)
+
+        failed = [
+            f"{result['scenario']} c={result['concurrency']} "
+            f"({result['errors']}/{result['requests']})"
+            for result in results
+            if result["errors"]
+        ]
+        if failed:
+            raise CommandError(
+                f"Requests failed in {', '.join(failed)}; "
+                "the timings of these runs measure errors."
+            )
+
+    def transport(self, user, url):
+        cookies = benchmark.session_cookies(user)
+        if url:
+            return benchmark.HttpTransport(url, cookies)
+        return benchmark.TestClientTransport(cookies)
+
+    def format_result(self, result):
+        def number(value, digits=1):
+            return "-" if value is None else f"{value:.{digits}f}"
+
+        return (
+            f"{result['scenario']:<13} c={result['concurrency']:<3} "
+            f"n={result['requests']:<5} errors={result['errors']:<4} "
+            f"p50={number(result['p50_ms'])}ms p95={number(result['p95_ms'])}ms "
+            f"p99={number(result['p99_ms'])}ms "
+            f"rps={number(result['throughput_rps'])} "
+            f"queries={number(result['mean_queries'])}"
+        )
@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+
+class Command(BaseCommand):
+    """
+    Report the effective database connection settings and check that the database answers.
+    Run at startup, so a misconfigured deployment fails before serving requests.
+    """
+
+    help = "Check the database connection and report persistence, health check and pooling settings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database alias to check.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        config = connection.settings_dict
+
+        max_age = config["CONN_MAX_AGE"]
+        if max_age is None:
+            persistence = "unlimited"
+        elif max_age:
+            persistence = f"{max_age} s"
+        else:
+            persistence = "off"
+        pool = config.get("OPTIONS", {}).get("pool")
+        if pool:
+            pooling = "psycopg pool" + (
+                f" ({pool['min_size']}-{pool['max_size']} connections)"
+                if isinstance(pool, dict)
+                else ""
+            )
+        elif settings.DB_POOL == "pgbouncer":
+            pooling = "pgbouncer"
+        else:
+            pooling = "off"
+
+        location = config["NAME"]
+        if connection.vendor != "sqlite":
+            location = f"{config['HOST']}:{config['PORT']}/{config['NAME']}"
+        self.stdout.write(f"Database: {connection.vendor} at {location}")
+        self.stdout.write(f"Persistent connections: {persistence}")
+        self.stdout.write(
+            f"Health checks: {'on' if config['CONN_HEALTH_CHECKS'] else 'off'}"
+        )
+        self.stdout.write(f"Pooling: {pooling}")
+        self.stdout.write(
+            "Server-side cursors: "
+            + ("off" if config.get("DISABLE_SERVER_SIDE_CURSORS") else "on")
+        )
+
+        connection.close()
+        try:
+            started = time.perf_counter()
+            connection.ensure_connection()
+            connected = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            answered = time.perf_counter()
+        except OperationalError as error:
+            raise CommandError(f"Cannot connect to the database: {error}") from error
+
+        self.stdout.write(
+            f"Connected in {(connected - started) * 1000:.1f} ms, "
+            f"round trip {(answered - connected) * 1000:.1f} ms"
+        )
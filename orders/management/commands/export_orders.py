@@ -0,0 +1,72 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from orders.exports import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    export_queryset,
+    export_range,
+    export_rows,
+)
+
+
+class Command(BaseCommand):
+    """
+    Export the order history for accounting without loading it into memory.
+    """
+
+    help = "Export paid and cancelled orders as CSV or JSON Lines, one row per order line."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=sorted(EXPORT_FORMATS),
+            default="csv",
+            help="Output format.",
+        )
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="First day of orders to export (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            help="Last day of orders to export (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write; defaults to standard output.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help="Number of rows fetched from the database at a time.",
+        )
+
+    def handle(self, *args, **options):
+        lines, content_type = EXPORT_FORMATS[options["format"]]
+        self.exported = 0
+        rows = self.count(
+            export_rows(
+                export_queryset(*export_range(options["start"], options["end"])),
+                chunk_size=options["chunk_size"],
+            )
+        )
+
+        if options["output"]:
+            # The csv module expects files opened with newline=""
+            with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                output.writelines(lines(rows))
+            self.stdout.write(
+                f"Exported {self.exported} order lines to {options['output']}."
+            )
+        else:
+            for line in lines(rows):
+                self.stdout.write(line, ending="")
+
+    def count(self, rows):
+        for row in rows:
+            self.exported += 1
+            yield row
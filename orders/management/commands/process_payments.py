@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders.payments import process_pending_payments
+
+
+class Command(BaseCommand):
+    """
+    Verify pending payments left in the database job queue.
+    """
+
+    help = "Verify pending payments with the payment gateway and mark their orders as paid."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=100,
+            help="Maximum number of payments verified per pass.",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            metavar="SECONDS",
+            help="Keep running, polling for pending payments every SECONDS.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            payments = process_pending_payments(options["limit"])
+            if payments:
+                verified = sum(payment.status == "V" for payment in payments)
+                self.stdout.write(
+                    f"Processed {len(payments)} payments, {verified} verified."
+                )
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
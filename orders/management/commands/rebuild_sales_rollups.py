@@ -0,0 +1,63 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from orders.models import Order
+from orders.reporting import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    """
+    Backfill or repair the hourly and daily sales rollups from the order lines.
+    """
+
+    help = "Re-aggregate the sales rollups of a date range from the paid orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="First day to re-aggregate (YYYY-MM-DD); defaults to the first order.",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            help="Last day to re-aggregate (YYYY-MM-DD); defaults to today.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=31,
+            help="Number of days re-aggregated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"]
+        if start is None:
+            first = (
+                Order.objects.filter(state__in=Order.SOLD_STATES)
+                .order_by("date")
+                .values_list("date", flat=True)
+                .first()
+            )
+            if first is None:
+                self.stdout.write("No paid orders to aggregate.")
+                return
+            start = timezone.localtime(first).date()
+        end = options["end"] or timezone.localdate()
+        if end < start:
+            raise CommandError("--end must not be before --start.")
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+
+        written = 0
+        day = start
+        while day <= end:
+            last = min(day + timedelta(days=options["days"] - 1), end)
+            written += rebuild_sales_rollups(
+                timezone.make_aware(datetime.combine(day, time.min)),
+                timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min)),
+            )
+            day = last + timedelta(days=1)
+
+        self.stdout.write(f"Wrote {written} rollup rows for {start} to {end}.")
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from orders.models import Order, stored_cart_totals
+
+
+class Command(BaseCommand):
+    """
+    Recompute the stored cart totals of orders from their order details and repair any drift.
+    """
+
+    help = "Recompute Order.items_count and Order.total_amount and repair drifted rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Check completed orders as well as open carts.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of orders checked per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drifted orders without saving them.",
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.order_by("pk")
+        if not options["all"]:
+            orders = orders.filter(state__in=Order.OPEN_STATES)
+        pks = list(orders.values_list("pk", flat=True))
+
+        drifted = 0
+        for start in range(0, len(pks), options["batch_size"]):
+            batch = pks[start : start + options["batch_size"]]
+            with transaction.atomic():
+                # Cart updates lock the order row too, so none can change the lines
+                # between comparing the totals and writing them
+                locked = list(
+                    Order.objects.select_for_update()
+                    .filter(pk__in=batch)
+                    .values_list("pk", flat=True)
+                )
+                stale = list(
+                    Order.objects.filter(pk__in=locked)
+                    .with_cart_totals()
+                    .exclude(
+                        items_count=F("cart_items_sum"),
+                        total_amount=F("cart_total_sum"),
+                    )
+                    .values_list("pk", flat=True)
+                )
+                if stale and not options["dry_run"]:
+                    Order.objects.filter(pk__in=stale).update(**stored_cart_totals())
+            drifted += len(stale)
+
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {len(pks)} orders. {action} {drifted} drifted orders."
+            )
+        )
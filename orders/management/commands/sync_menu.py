@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from orders.catalog import CatalogError, apply_menu_diff, diff_menu, load_catalog
+
+
+class Command(BaseCommand):
+    """
+    Bring the menu in line with a catalog file in one transaction.
+    """
+
+    help = "Sync menu items and menu types with a CSV or JSON catalog, applying only the changes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("catalog", help="Path to the CSV or JSON catalog file.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "json"],
+            help="Catalog format; defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--keep-missing",
+            action="store_true",
+            help="Leave menu items missing from the catalog available.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the changes without saving them.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            diff = diff_menu(
+                load_catalog(options["catalog"], options["format"]),
+                disable_missing=not options["keep_missing"],
+            )
+        except CatalogError as error:
+            raise CommandError(str(error)) from error
+
+        for menu_type in diff.types:
+            self.stdout.write(f"New menu type: {menu_type.name}")
+        for item in diff.created:
+            self.stdout.write(f"Created: {item.name}")
+        for item, changed in diff.updated:
+            self.stdout.write(f"Updated: {item.name} ({', '.join(changed)})")
+        for item in diff.disabled:
+            self.stdout.write(f"Unavailable: {item.name}")
+
+        if not options["dry_run"]:
+            apply_menu_diff(diff)
+        self.stdout.write(
+            f"{'Would apply' if options['dry_run'] else 'Applied'}: "
+            f"{len(diff.created)} created, {len(diff.updated)} updated, "
+            f"{len(diff.disabled)} unavailable, {diff.unchanged} unchanged."
+        )
@@ -0,0 +1,181 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from orders.routers import PIN_COOKIE, RequestState, request_state
+
+logger = logging.getLogger("orders.queries")
+
+# Only these statements count towards duplicates; BEGIN, SAVEPOINT and the like repeat legitimately
+DATA_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+class QueryCounter:
+    """
+    Database execute wrapper recording the number, duration and repetition of SQL queries.
+
+    Attributes:
+        count (int): The number of executed queries.
+        duration (float): The total time spent executing queries, in seconds.
+        statements (Counter): Executions per SELECT/INSERT/UPDATE/DELETE statement
+            (with parameter placeholders).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            if sql.lstrip()[:6].upper() in DATA_STATEMENTS:
+                self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Get the number of executions that repeated an earlier statement, the signature of N+1 queries.
+        """
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def most_repeated(self, limit=3):
+        """
+        Get the most repeated statements with their execution counts.
+        """
+        return [
+            (sql, count) for sql, count in self.statements.most_common(limit) if count > 1
+        ]
+
+
+# The counter of the request being handled. A context variable follows the request into
+# the threads its async views and middleware run queries in, where the connections differ
+# from those of the thread that started handling it
+current_counter = ContextVar("query_counter", default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Database execute wrapper installed on every connection (see orders.signals), passing
+    queries to the counter of the current request, if any.
+    """
+    counter = current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+class ContextMiddleware:
+    """
+    Base of middleware that keeps per-request state in a context variable while the
+    rest of the stack runs.
+
+    It runs in the mode of the handler, synchronously under WSGI and as a coroutine
+    under ASGI, so async views are not switched to a thread and back. Subclasses set
+    `context` and implement start(request), returning the state, and
+    finish(request, response, state), returning the response.
+    """
+
+    sync_capable = True
+    async_capable = True
+    context = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = self.context.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.context.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = self.context.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.context.reset(token)
+        return self.finish(request, response, state)
+
+
+class QueryInstrumentationMiddleware(ContextMiddleware):
+    """
+    Record the SQL queries issued while handling each request.
+
+    With DEBUG enabled the numbers are returned in X-DB-Query-Count, X-DB-Query-Time (ms) and
+    X-DB-Duplicate-Queries response headers; otherwise they are logged as JSON to the
+    "orders.queries" logger.
+    """
+
+    context = current_counter
+
+    def start(self, request):
+        return QueryCounter()
+
+    def finish(self, request, response, counter):
+        if settings.DEBUG:
+            response["X-DB-Query-Count"] = str(counter.count)
+            response["X-DB-Query-Time"] = f"{counter.duration * 1000:.2f}"
+            response["X-DB-Duplicate-Queries"] = str(counter.duplicates)
+        else:
+            record = {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "queries": counter.count,
+                "query_time_ms": round(counter.duration * 1000, 2),
+                "duplicate_queries": counter.duplicates,
+            }
+            if counter.duplicates:
+                record["repeated"] = counter.most_repeated()
+                logger.warning(json.dumps(record))
+            else:
+                logger.info(json.dumps(record))
+        return response
+
+
+class ReplicaPinMiddleware(ContextMiddleware):
+    """
+    Track database writes per request for orders.routers.ReplicaRouter.
+
+    A request that writes gets a cookie pinning the client's following requests to the
+    default database for REPLICA_PIN_SECONDS, so it reads its own writes (e.g. the cart
+    after adding an item) instead of a lagging replica. The cookie holds the time the pin
+    expires, so clients keeping cookies past their max-age are not pinned forever.
+    """
+
+    context = request_state
+
+    def start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RequestState(pinned=pinned)
+
+    def finish(self, request, response, state):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
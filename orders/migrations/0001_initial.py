@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('Pizza', 'Pizza'), ('Pasta', 'Pasta'), ('Drinks', 'Drinks')], max_length=10)),
+                ('description', models.CharField(max_length=150, null=True)),
+            ],
+            options={
+                'db_table': 'menu_type',
+            },
+        ),
+        migrations.CreateModel(
+            name='Menu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='')),
+                ('ingredients', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('A', 'Available'), ('U', 'Unavailable')], max_length=1)),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.menutype')),
+            ],
+            options={
+                'db_table': 'menu',
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('status', models.BooleanField(default=False)),
+                ('transaction', models.CharField(max_length=100, null=True)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'order',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderDetails',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('no_of_serving', models.IntegerField(blank=True, default=0, null=True)),
+                ('menu', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.menu')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_details', to='orders.order')),
+            ],
+            options={
+                'db_table': 'order_details',
+            },
+        ),
+    ]
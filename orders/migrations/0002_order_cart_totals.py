@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    """
+    Store the number of servings and the total cost of every existing order, which
+    cart updates keep up to date from now on.
+    """
+    Order = apps.get_model("orders", "Order")
+    manager = Order.objects.db_manager(schema_editor.connection.alias)
+    line_total = ExpressionWrapper(
+        F("order_details__no_of_serving")
+        # Completed orders keep the price frozen in the order line
+        * Coalesce(F("order_details__amount"), F("order_details__menu__price")),
+        output_field=DecimalField(max_digits=9, decimal_places=2),
+    )
+    orders = manager.annotate(
+        items=Coalesce(Sum("order_details__no_of_serving"), 0),
+        total=Coalesce(Sum(line_total), 0, output_field=DecimalField()),
+    ).order_by("pk")
+    batch = []
+    for order in orders.iterator(chunk_size=500):
+        order.items_count = order.items
+        order.total_amount = order.total
+        batch.append(order)
+        if len(batch) == 500:
+            manager.bulk_update(batch, ["items_count", "total_amount"])
+            batch = []
+    manager.bulk_update(batch, ["items_count", "total_amount"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
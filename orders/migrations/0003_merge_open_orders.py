@@ -0,0 +1,69 @@
+from django.db import migrations
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+
+
+def merge_open_orders(apps, schema_editor):
+    """
+    Move the lines of every customer's open orders into the newest one and delete the
+    others, so every customer has at most one shopping cart.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderDetails = apps.get_model("orders", "OrderDetails")
+    db_alias = schema_editor.connection.alias
+    open_orders = Order.objects.using(db_alias).filter(
+        customer__isnull=False, status=False
+    )
+    customers = (
+        open_orders.values("customer")
+        .annotate(orders=Count("id"))
+        .filter(orders__gt=1)
+        .values_list("customer", flat=True)
+    )
+    for customer in list(customers):
+        kept, *merged = open_orders.filter(customer=customer).order_by("-date", "-pk")
+        lines = {line.menu_id: line for line in kept.order_details.using(db_alias)}
+        merged_lines = OrderDetails.objects.using(db_alias).filter(order__in=merged)
+        for line in merged_lines.order_by("pk"):
+            if line.menu_id is not None and line.menu_id in lines:
+                # Same dish in both carts: add up the servings
+                existing = lines[line.menu_id]
+                existing.no_of_serving = (existing.no_of_serving or 0) + (
+                    line.no_of_serving or 0
+                )
+                existing.save(using=db_alias, update_fields=["no_of_serving"])
+                line.delete(using=db_alias)
+            else:
+                line.order = kept
+                line.save(using=db_alias, update_fields=["order"])
+                lines.setdefault(line.menu_id, line)
+        Order.objects.using(db_alias).filter(
+            pk__in=[order.pk for order in merged]
+        ).delete()
+        totals = kept.order_details.using(db_alias).aggregate(
+            items=Coalesce(Sum("no_of_serving"), 0),
+            total=Coalesce(
+                Sum(
+                    ExpressionWrapper(
+                        F("no_of_serving") * F("menu__price"),
+                        output_field=DecimalField(max_digits=9, decimal_places=2),
+                    )
+                ),
+                0,
+                output_field=DecimalField(),
+            ),
+        )
+        Order.objects.using(db_alias).filter(pk=kept.pk).update(
+            items_count=totals["items"], total_amount=totals["total"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_order_cart_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_open_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """
+    Merge order lines of the same menu item into the oldest one, adding up their
+    servings, so every order has at most one line per menu item.
+    """
+    OrderDetails = apps.get_model("orders", "OrderDetails")
+    db_alias = schema_editor.connection.alias
+    lines = OrderDetails.objects.using(db_alias)
+    duplicates = (
+        lines.filter(order__isnull=False, menu__isnull=False)
+        .values("order", "menu")
+        .annotate(lines=Count("id"))
+        .filter(lines__gt=1)
+    )
+    for duplicate in list(duplicates):
+        kept, *merged = lines.filter(
+            order=duplicate["order"], menu=duplicate["menu"]
+        ).order_by("id")
+        kept.no_of_serving = sum(
+            line.no_of_serving or 0 for line in [kept, *merged]
+        )
+        if kept.amount is None:
+            kept.amount = next(
+                (line.amount for line in merged if line.amount is not None), None
+            )
+        kept.save(using=db_alias, update_fields=["no_of_serving", "amount"])
+        lines.filter(pk__in=[line.pk for line in merged]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_order_unique_open_order_per_customer"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_merge_duplicate_lines'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(fields=['status', 'type', 'price'], name='menu_status_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['date'], name='order_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['transaction'], name='order_transaction_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderdetails',
+            constraint=models.UniqueConstraint(fields=('order', 'menu'), name='unique_order_details_menu'),
+        ),
+    ]
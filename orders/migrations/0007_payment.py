@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_orders_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('gateway_reference', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('V', 'Verified'), ('F', 'Failed')], default='P', max_length=1)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='orders.order')),
+            ],
+            options={
+                'db_table': 'payment',
+                'indexes': [models.Index(condition=models.Q(('status', 'P')), fields=['created'], name='payment_pending_idx')],
+            },
+        ),
+    ]
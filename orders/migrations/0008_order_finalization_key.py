@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='finalization_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+
+def state_from_status(apps, schema_editor):
+    """
+    Map the former completion flag onto the order state: completed orders were paid
+    and handed over, open ones with a payment being verified await it and the others
+    are shopping carts.
+    """
+    Order = apps.get_model("orders", "Order")
+    orders = Order.objects.using(schema_editor.connection.alias)
+    orders.filter(status=True).update(state="delivered")
+    orders.filter(status=False).update(state="cart")
+    orders.filter(status=False, payments__status="P").update(state="pending_payment")
+
+
+def status_from_state(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    orders = Order.objects.using(schema_editor.connection.alias)
+    orders.exclude(state__in=("cart", "pending_payment", "cancelled")).update(status=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0008_order_finalization_key"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="order",
+            name="unique_open_order_per_customer",
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="state",
+            field=models.CharField(
+                choices=[
+                    ("cart", "Cart"),
+                    ("pending_payment", "Pending payment"),
+                    ("paid", "Paid"),
+                    ("preparing", "Preparing"),
+                    ("ready", "Ready"),
+                    ("delivered", "Delivered"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="cart",
+                max_length=16,
+            ),
+        ),
+        migrations.RunPython(state_from_status, status_from_state),
+    ]
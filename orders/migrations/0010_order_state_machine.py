@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_state', models.CharField(choices=[('cart', 'Cart'), ('pending_payment', 'Pending payment'), ('paid', 'Paid'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=16)),
+                ('to_state', models.CharField(choices=[('cart', 'Cart'), ('pending_payment', 'Pending payment'), ('paid', 'Paid'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'order state history',
+                'db_table': 'order_state_history',
+                'ordering': ['created', 'pk'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='status',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['state', 'date'], name='order_state_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state__in', ('paid', 'preparing', 'ready'))), fields=['date'], name='order_kitchen_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state', 'cart')), fields=['date'], name='order_open_cart_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('state__in', ('cart', 'pending_payment'))), fields=('customer',), name='unique_open_order_per_customer'),
+        ),
+        migrations.AddField(
+            model_name='orderstatehistory',
+            name='changed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderstatehistory',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_history', to='orders.order'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_state_machine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('H', 'Hour'), ('D', 'Day')], max_length=1)),
+                ('period_start', models.DateTimeField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('servings', models.IntegerField(default=0)),
+                ('menu', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='orders.menu')),
+            ],
+            options={
+                'db_table': 'menu_sales_rollup',
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'menu'), name='unique_menu_sales_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MenuTypeSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('H', 'Hour'), ('D', 'Day')], max_length=1)),
+                ('period_start', models.DateTimeField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('servings', models.IntegerField(default=0)),
+                ('menu_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='orders.menutype')),
+            ],
+            options={
+                'db_table': 'menu_type_sales_rollup',
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'menu_type'), name='unique_menu_type_sales_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_menu_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='gateway_reference',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -1,5 +1,22 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+from django.utils.functional import cached_property
+
+# Sent after an order moved to a new state, with order, from_state, to_state and user
+order_state_changed = Signal()
 
 
 class MenuType(models.Model):
@@ -41,6 +58,7 @@ class Menu(models.Model):
         image (ImageField, optional): An optional image for the menu item.
         ingredients (CharField): The ingredients used in the menu item.
         status (CharField): The availability status of the menu item (A for Available, U for Unavailable).
+        image_variants (JSONField): Names of the resized copies of the image, see orders.images.
     """
 
     MENU_STATUS_CHOICES = (
@@ -55,9 +73,16 @@ class Menu(models.Model):
     image = models.ImageField(null=True, blank=True)
     ingredients = models.CharField(max_length=500)
     status = models.CharField(max_length=1, choices=MENU_STATUS_CHOICES)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         db_table = "menu"
+        indexes = [
+            # Serves the available-menu listing: filter on status, sorted by type and price
+            models.Index(
+                fields=["status", "type", "price"], name="menu_status_type_price_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -73,6 +98,111 @@ class Menu(models.Model):
             url = ""
         return url
 
+    def image_srcset(self, image_format):
+        """
+        Get a srcset attribute value listing the resized copies of the image in a format.
+
+        Args:
+            image_format (str): "fallback" (the original's format), "webp" or "avif".
+
+        Returns:
+            str: E.g. "/uploads/thumbnails/pizza-0cc175b9c0f1-120.webp 120w, ...", or "" if the
+            variants of the current image were not generated yet.
+        """
+        if not self.image or self.image_variants.get("source") != self.image.name:
+            return ""
+        return ", ".join(
+            f"{self.image.storage.url(name)} {width}w"
+            for width, name in self.image_variants.get(image_format, [])
+        )
+
+    @property
+    def image_fallback_srcset(self):
+        """
+        Get the srcset of the menu item's image in the original's format.
+        """
+        return self.image_srcset("fallback")
+
+    @property
+    def image_webp_srcset(self):
+        """
+        Get the srcset of the menu item's image as WebP.
+        """
+        return self.image_srcset("webp")
+
+    @property
+    def image_avif_srcset(self):
+        """
+        Get the srcset of the menu item's image as AVIF.
+        """
+        return self.image_srcset("avif")
+
+
+def cart_aggregates(prefix=""):
+    """
+    Build the aggregate expressions for the number of servings and the total cost of a cart.
+
+    Args:
+        prefix (str): Lookup path from the queried model to OrderDetails (e.g. "order_details__").
+
+    Returns:
+        dict: Expressions keyed by "cart_items_sum" and "cart_total_sum".
+    """
+    servings = F(f"{prefix}no_of_serving")
+    # Finalized orders keep the price frozen in the order line
+    price = Coalesce(F(f"{prefix}amount"), F(f"{prefix}menu__price"))
+    line_total = ExpressionWrapper(
+        servings * price,
+        output_field=DecimalField(max_digits=9, decimal_places=2),
+    )
+    return {
+        "cart_items_sum": Coalesce(Sum(servings), 0),
+        "cart_total_sum": Coalesce(
+            Sum(line_total),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(max_digits=9, decimal_places=2),
+        ),
+    }
+
+
+def stored_cart_totals():
+    """
+    Build the expressions recomputing Order.items_count and Order.total_amount from the
+    order details, for use in an UPDATE of orders.
+
+    Returns:
+        dict: Subquery expressions keyed by "items_count" and "total_amount".
+    """
+    lines = (
+        OrderDetails.objects.filter(order=OuterRef("pk"))
+        .order_by()
+        .values("order")
+        .annotate(**cart_aggregates())
+    )
+    return {
+        "items_count": Coalesce(Subquery(lines.values("cart_items_sum")), 0),
+        "total_amount": Coalesce(
+            Subquery(lines.values("cart_total_sum")),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(max_digits=9, decimal_places=2),
+        ),
+    }
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_cart_totals(self):
+        """
+        Annotate each order with its cart item count and total cost, so lists of orders
+        need no extra query per row.
+        """
+        return self.annotate(**cart_aggregates("order_details__"))
+
+
+class InvalidStateTransition(ValueError):
+    """
+    Raised when an order cannot move to the requested state from its current state.
+    """
+
 
 class Order(models.Model):
     """
@@ -82,36 +212,222 @@ class Order(models.Model):
         id (BigAutoField): The unique identifier for the order.
         customer (ForeignKey): The customer who placed the order (related to User).
         date (DateTimeField): The date and time when the order was placed.
-        status (BooleanField): The status of the order (True for completed, False for pending).
+        state (CharField): The lifecycle state of the order, changed only through transition_to().
         transaction (CharField, optional): The transaction ID for the order (if applicable).
+        items_count (IntegerField): Stored number of servings in the order, recomputed by cart updates.
+        total_amount (DecimalField): Stored total cost of the order, recomputed by cart updates.
+        finalization_key (CharField, optional): Idempotency key of the payment that finalized the order.
     """
 
+    CART = "cart"
+    PENDING_PAYMENT = "pending_payment"
+    PAID = "paid"
+    PREPARING = "preparing"
+    READY = "ready"
+    DELIVERED = "delivered"
+    CANCELLED = "cancelled"
+
+    STATE_CHOICES = (
+        (CART, "Cart"),
+        (PENDING_PAYMENT, "Pending payment"),
+        (PAID, "Paid"),
+        (PREPARING, "Preparing"),
+        (READY, "Ready"),
+        (DELIVERED, "Delivered"),
+        (CANCELLED, "Cancelled"),
+    )
+
+    # Allowed moves from each state; delivered and cancelled orders are final
+    TRANSITIONS = {
+        CART: (PENDING_PAYMENT, CANCELLED),
+        PENDING_PAYMENT: (PAID, CART, CANCELLED),
+        PAID: (PREPARING, CANCELLED),
+        PREPARING: (READY, CANCELLED),
+        READY: (DELIVERED, CANCELLED),
+    }
+
+    # The customer's shopping cart, before and while it is being paid for
+    OPEN_STATES = (CART, PENDING_PAYMENT)
+    # Paid orders the kitchen still has to hand over
+    KITCHEN_STATES = (PAID, PREPARING, READY)
+    # Orders that count as sales in the reporting rollups
+    SOLD_STATES = (PAID, PREPARING, READY, DELIVERED)
+
     # id = models.UUIDField(default = uuid.uuid4, unique=True, primary_key = True, editable=False)
     customer = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
     date = models.DateTimeField(auto_now_add=True)
-    status = models.BooleanField(default=False)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=CART)
     transaction = models.CharField(max_length=100, null=True)
+    items_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    finalization_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         db_table = "order"
+        constraints = [
+            # A customer has at most one open order (shopping cart)
+            models.UniqueConstraint(
+                fields=["customer"],
+                condition=models.Q(state__in=("cart", "pending_payment")),
+                name="unique_open_order_per_customer",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date"], name="order_date_idx"),
+            models.Index(fields=["transaction"], name="order_transaction_idx"),
+            models.Index(fields=["state", "date"], name="order_state_date_idx"),
+            # Serves the kitchen queue, which only holds a small slice of all orders
+            models.Index(
+                fields=["date"],
+                condition=models.Q(state__in=("paid", "preparing", "ready")),
+                name="order_kitchen_queue_idx",
+            ),
+            # Serves listings of open shopping carts, e.g. to find abandoned ones
+            models.Index(
+                fields=["date"],
+                condition=models.Q(state="cart"),
+                name="order_open_cart_idx",
+            ),
+        ]
+
+    def can_transition_to(self, state):
+        """
+        Check whether the order may move from its current state to the given state.
+        """
+        return state in self.TRANSITIONS.get(self.state, ())
+
+    def transition_to(self, state, user=None):
+        """
+        Move the order to a new state and record the change in its state history.
+
+        The state is updated only if the row still holds the state read by this
+        instance, so two concurrent transitions of the same order cannot both succeed.
+
+        Args:
+            state (str): The new state, one of Order.STATE_CHOICES.
+            user (User, optional): The user making the change.
+
+        Raises:
+            InvalidStateTransition: If the transition is not allowed, or the order's
+                state changed concurrently.
+        """
+        previous = self.state
+        if not self.can_transition_to(state):
+            raise InvalidStateTransition(f"Cannot move order from {previous} to {state}")
+
+        with transaction.atomic(savepoint=False):
+            updated = Order.objects.filter(pk=self.pk, state=previous).update(state=state)
+            if updated:
+                OrderStateHistory.objects.create(
+                    order=self,
+                    from_state=previous,
+                    to_state=state,
+                    changed_by=user if user is not None and user.is_authenticated else None,
+                )
+        if not updated:
+            raise InvalidStateTransition(f"Order is no longer {previous}")
+        self.state = state
+        order_state_changed.send(
+            sender=Order, order=self, from_state=previous, to_state=state, user=user
+        )
+
+    @cached_property
+    def cart_summary(self):
+        """
+        Get the number of items and the total cost of the order with a single aggregate query.
+        The result is memoized on the instance; orders loaded through
+        Order.objects.with_cart_totals() reuse their annotations instead.
+        """
+        if hasattr(self, "cart_items_sum"):
+            return {"items": self.cart_items_sum, "total": self.cart_total_sum}
+        summary = self.order_details.aggregate(**cart_aggregates())
+        return {"items": summary["cart_items_sum"], "total": summary["cart_total_sum"]}
+
+    async def aload_cart_summary(self):
+        """
+        Async counterpart of cart_summary. Runs the aggregate with the async ORM and memoizes
+        the result, so cart_total and cart_items can then be read without a query.
+        """
+        if "cart_summary" not in self.__dict__ and not hasattr(self, "cart_items_sum"):
+            summary = await self.order_details.aaggregate(**cart_aggregates())
+            self.__dict__["cart_summary"] = {
+                "items": summary["cart_items_sum"],
+                "total": summary["cart_total_sum"],
+            }
+        return self.cart_summary
+
+    def refresh_cart_summary(self):
+        """
+        Drop the memoized cart summary after the order details have changed.
+        """
+        self.__dict__.pop("cart_summary", None)
+        for name in ("cart_items_sum", "cart_total_sum"):
+            self.__dict__.pop(name, None)
+
+    def sync_cart_totals(self):
+        """
+        Recompute the stored cart totals from the order details with one UPDATE.
+
+        The totals are priced like cart_total, so they stay equal to the amount charged
+        even when a dish's price changed while it was in the cart.
+        """
+        Order.objects.filter(pk=self.pk).update(**stored_cart_totals())
+        # Defer the stored columns so the next access reads the updated values
+        for name in ("items_count", "total_amount"):
+            self.__dict__.pop(name, None)
+        self.refresh_cart_summary()
 
     @property
     def cart_total(self):
         """
         Get the total cost of items in the order.
         """
-        order_items = self.order_details.all()
-        total = sum([item.total for item in order_items])
-        return total
+        return self.cart_summary["total"]
 
     @property
     def cart_items(self):
         """
         Get the total number of items in the order.
         """
-        order_items = self.order_details.all()
-        total = sum([item.no_of_serving for item in order_items])
-        return total
+        return self.cart_summary["items"]
+
+
+class OrderStateHistory(models.Model):
+    """
+    Model to represent a single change of an order's state. Rows are only ever added.
+
+    Attributes:
+        id (BigAutoField): The unique identifier for the history entry.
+        order (ForeignKey): The order whose state changed (related to Order).
+        from_state (CharField): The state the order left.
+        to_state (CharField): The state the order entered.
+        changed_by (ForeignKey, optional): The user who made the change (related to User).
+        created (DateTimeField): The date and time of the change.
+    """
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="state_history")
+    from_state = models.CharField(max_length=16, choices=Order.STATE_CHOICES)
+    to_state = models.CharField(max_length=16, choices=Order.STATE_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "order_state_history"
+        ordering = ["created", "pk"]
+        verbose_name_plural = "order state history"
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_state} -> {self.to_state}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order state history entries cannot be changed")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Order state history entries cannot be deleted")
 
 
 class OrderDetails(models.Model):
@@ -122,7 +438,7 @@ class OrderDetails(models.Model):
         id (BigAutoField): The unique identifier for the order details.
         order (ForeignKey): The order to which the item belongs (related to Order).
         menu (ForeignKey): The menu item included in the order (related to Menu).
-        amount (DecimalField, optional): The amount (price) for the menu item in the order.
+        amount (DecimalField, optional): The price of the menu item, frozen when the order is finalized.
         no_of_serving (IntegerField): The number of servings of the menu item in the order.
     """
 
@@ -140,11 +456,144 @@ class OrderDetails(models.Model):
 
     class Meta:
         db_table = "order_details"
+        constraints = [
+            # Each dish has a single line per order, updated in place by cart updates
+            models.UniqueConstraint(
+                fields=["order", "menu"], name="unique_order_details_menu"
+            ),
+        ]
 
     @property
     def total(self):
         """
-        Calculate the total cost of the item in the order.
+        Calculate the total cost of the item in the order, at the frozen price once the order is finalized.
         """
-        total = self.menu.price * self.no_of_serving
+        price = self.amount if self.amount is not None else self.menu.price
+        total = price * self.no_of_serving
         return total
+
+
+class Payment(models.Model):
+    """
+    Model to represent a payment submitted for an order, verified in the background.
+
+    Attributes:
+        id (BigAutoField): The unique identifier for the payment.
+        order (ForeignKey): The order being paid for (related to Order).
+        idempotency_key (CharField): Client-generated key; resubmitting the same key returns the same payment.
+        gateway_reference (CharField): The payment's identifier at the payment gateway (e.g. PayPal order ID), unique so a captured payment pays for one order only.
+        amount (DecimalField): The amount due, computed server-side from the order when the payment is recorded.
+        status (CharField): The verification status (P for Pending, V for Verified, F for Failed).
+        error (CharField, optional): Why verification failed.
+        created (DateTimeField): The date and time when the payment was recorded.
+        updated (DateTimeField): The date and time of the last status change.
+    """
+
+    PAYMENT_STATUS_CHOICES = (
+        ("P", "Pending"),
+        ("V", "Verified"),
+        ("F", "Failed"),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="payments")
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    gateway_reference = models.CharField(max_length=100, unique=True)
+    amount = models.DecimalField(max_digits=9, decimal_places=2)
+    status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES, default="P")
+    error = models.CharField(max_length=255, blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "payment"
+        indexes = [
+            # Serves the pending-payment job queue
+            models.Index(
+                fields=["created"],
+                condition=models.Q(status="P"),
+                name="payment_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway_reference} ({self.get_status_display()})"
+
+
+class SalesRollup(models.Model):
+    """
+    Abstract model for sales totals pre-aggregated per hour or per day, kept up to date
+    as orders are paid (see orders.reporting).
+
+    Attributes:
+        period (CharField): The length of the period (H for Hour, D for Day).
+        period_start (DateTimeField): The start of the period, in the current time zone.
+        revenue (DecimalField): The revenue of the paid order lines in the period.
+        orders (IntegerField): The number of paid orders in the period.
+        servings (IntegerField): The number of servings sold in the period.
+    """
+
+    HOUR = "H"
+    DAY = "D"
+    PERIOD_CHOICES = (
+        (HOUR, "Hour"),
+        (DAY, "Day"),
+    )
+
+    period = models.CharField(max_length=1, choices=PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    servings = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class MenuSalesRollup(SalesRollup):
+    """
+    Model to represent the sales of a menu item in an hour or a day.
+
+    Attributes:
+        menu (ForeignKey): The menu item sold (related to Menu).
+    """
+
+    menu = models.ForeignKey(Menu, on_delete=models.CASCADE, related_name="sales_rollups")
+
+    class Meta:
+        db_table = "menu_sales_rollup"
+        constraints = [
+            # One row per item and period; also serves date range reads per period
+            models.UniqueConstraint(
+                fields=["period", "period_start", "menu"],
+                name="unique_menu_sales_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.menu} {self.get_period_display()} {self.period_start:%Y-%m-%d %H:%M}"
+
+
+class MenuTypeSalesRollup(SalesRollup):
+    """
+    Model to represent the sales of a menu type in an hour or a day.
+
+    Attributes:
+        menu_type (ForeignKey): The menu type sold (related to MenuType).
+    """
+
+    menu_type = models.ForeignKey(
+        MenuType, on_delete=models.CASCADE, related_name="sales_rollups"
+    )
+
+    class Meta:
+        db_table = "menu_type_sales_rollup"
+        constraints = [
+            # One row per type and period; also serves date range reads per period
+            models.UniqueConstraint(
+                fields=["period", "period_start", "menu_type"],
+                name="unique_menu_type_sales_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_type} {self.get_period_display()} {self.period_start:%Y-%m-%d %H:%M}"
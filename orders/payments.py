@@ -0,0 +1,269 @@
+import base64
+import json
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+from orders import workers
+from orders.finalization import OrderFinalizationError, finalize_order
+from orders.models import InvalidStateTransition, Order, Payment
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentGatewayError(Exception):
+    """
+    Raised when the payment gateway cannot be reached or answers unexpectedly.
+    """
+
+
+class PaymentGateway:
+    """
+    Interface of the payment gateways that payments are verified against.
+    """
+
+    def verify(self, reference, amount, currency, order_id):
+        """
+        Check that the payment identified by `reference` was completed for the given
+        amount and order.
+
+        Args:
+            reference (str): The payment's identifier at the gateway.
+            amount (Decimal): The amount that must have been paid.
+            currency (str): The currency code of the amount.
+            order_id (int): The order the payment must have been made for.
+
+        Returns:
+            bool: True if the payment is complete and matches the amount and the order.
+        """
+        raise NotImplementedError
+
+
+class FakePaymentGateway(PaymentGateway):
+    """
+    Local gateway for tests and development. Every payment is verified, except those whose
+    reference starts with "fail".
+
+    Attributes:
+        calls (list): The (reference, amount, currency, order_id) of every verification,
+            across instances.
+    """
+
+    calls = []
+
+    def verify(self, reference, amount, currency, order_id):
+        self.calls.append((reference, amount, currency, order_id))
+        return not reference.startswith("fail")
+
+
+class PayPalGateway(PaymentGateway):
+    """
+    Verify payments captured by the PayPal JavaScript SDK with the PayPal Orders API.
+
+    The checkout page stores our order's id as the custom_id of the PayPal order, so a
+    captured payment cannot be used to pay for another order.
+    """
+
+    timeout = 10
+
+    def __init__(self):
+        self.api_url = settings.PAYPAL_API_URL.rstrip("/")
+
+    def request(self, path, data=None, headers=None):
+        request = urllib.request.Request(
+            self.api_url + path, data=data, headers=headers or {}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except (urllib.error.URLError, ValueError) as error:
+            raise PaymentGatewayError(f"PayPal request to {path} failed: {error}") from error
+
+    def access_token(self):
+        credentials = f"{settings.PAYPAL_CLIENT_ID}:{settings.PAYPAL_CLIENT_SECRET}"
+        response = self.request(
+            "/v1/oauth2/token",
+            data=urllib.parse.urlencode({"grant_type": "client_credentials"}).encode(),
+            headers={
+                "Authorization": "Basic " + base64.b64encode(credentials.encode()).decode(),
+            },
+        )
+        try:
+            return response["access_token"]
+        except (KeyError, TypeError) as error:
+            raise PaymentGatewayError("PayPal returned no access token") from error
+
+    def verify(self, reference, amount, currency, order_id):
+        paypal_order = self.request(
+            f"/v2/checkout/orders/{urllib.parse.quote(reference)}",
+            headers={"Authorization": f"Bearer {self.access_token()}"},
+        )
+        try:
+            if paypal_order.get("status") != "COMPLETED":
+                return False
+            purchase_unit = paypal_order["purchase_units"][0]
+            paid = purchase_unit["amount"]
+            return (
+                purchase_unit.get("custom_id") == str(order_id)
+                and Decimal(paid["value"]) == amount
+                and paid["currency_code"].upper() == (currency or "").upper()
+            )
+        except (
+            AttributeError,
+            IndexError,
+            InvalidOperation,
+            KeyError,
+            TypeError,
+            ValueError,
+        ) as error:
+            raise PaymentGatewayError(
+                f"Unexpected PayPal order {reference}: {error!r}"
+            ) from error
+
+
+def get_gateway():
+    """
+    Get an instance of the payment gateway configured in settings.PAYMENT_GATEWAY.
+    """
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+def record_payment(order, reference, idempotency_key):
+    """
+    Record a pending payment for an order and queue its verification.
+
+    The amount is the order's cart total, computed server-side while the order row is
+    locked, and the order moves to the pending payment state so its items cannot change
+    while it is being paid for. A repeated call with the same idempotency key returns
+    the payment recorded by the first call, and a gateway reference pays for a single
+    payment only.
+
+    Args:
+        order (Order): The customer's open order.
+        reference (str): The payment's identifier at the gateway.
+        idempotency_key (str): Client-generated key identifying this payment attempt.
+
+    Raises:
+        ValueError: If the order is empty or already being paid for, the key was used for
+            another order or the reference for another payment.
+
+    Returns:
+        Payment: The pending (or already processed) payment.
+    """
+    try:
+        with transaction.atomic():
+            # Cart batches lock the same row, so the items cannot change between
+            # computing the amount and leaving the cart state
+            order = Order.objects.select_for_update().get(pk=order.pk)
+            reused = Payment.objects.filter(gateway_reference=reference).exclude(
+                idempotency_key=idempotency_key
+            )
+            if reused.exists():
+                raise ValueError("Payment reference was already used")
+            payment, created = Payment.objects.get_or_create(
+                idempotency_key=idempotency_key,
+                defaults={
+                    "order": order,
+                    "gateway_reference": reference,
+                    "amount": order.cart_total,
+                },
+            )
+            if payment.order_id != order.pk:
+                raise ValueError("Idempotency key was used for another order")
+            if created:
+                if not payment.amount:
+                    raise ValueError("Cannot pay for an empty order")
+                if order.state != Order.CART:
+                    raise ValueError("A payment for this order is already pending")
+                order.transition_to(Order.PENDING_PAYMENT)
+                transaction.on_commit(lambda: workers.submit(verify_payment, payment.pk))
+    except IntegrityError as error:
+        # A concurrent request recorded a payment with the same reference
+        raise ValueError("Payment reference was already used") from error
+    return payment
+
+
+def verify_payment(payment_id):
+    """
+    Verify a pending payment with the gateway and mark its order as paid.
+
+    The payment fails if the gateway rejects it or the order cannot be finalized, e.g.
+    because its total changed since the payment was recorded; the order then goes back
+    to the cart state. Gateway errors leave the payment pending, to be retried by the
+    process_payments command.
+
+    Args:
+        payment_id (int): The payment to verify.
+
+    Returns:
+        Payment: The payment with its new status.
+    """
+    payment = Payment.objects.get(pk=payment_id)
+    if payment.status != "P":
+        return payment
+
+    try:
+        verified = get_gateway().verify(
+            payment.gateway_reference,
+            payment.amount,
+            settings.PAYPAL_CURRENCY,
+            payment.order_id,
+        )
+    except PaymentGatewayError:
+        logger.warning("Payment %s could not be verified, will retry", payment.pk, exc_info=True)
+        return payment
+
+    if verified:
+        try:
+            finalize_order(payment.order_id, payment.idempotency_key, payment.amount)
+        except OrderFinalizationError as error:
+            verified = False
+            payment.error = str(error)
+    else:
+        payment.error = "Payment was not completed at the gateway"
+
+    payment.status = "V" if verified else "F"
+    Payment.objects.filter(pk=payment.pk, status="P").update(
+        status=payment.status, error=payment.error
+    )
+    if not verified:
+        reopen_order(payment.order_id)
+    return payment
+
+
+def reopen_order(order_id):
+    """
+    Give an order whose payment failed back to the customer as a shopping cart.
+    """
+    order = Order.objects.get(pk=order_id)
+    if order.state == Order.PENDING_PAYMENT:
+        try:
+            order.transition_to(Order.CART)
+        except InvalidStateTransition:
+            # Another payment finalized or reopened the order in the meantime
+            pass
+
+
+def process_pending_payments(limit=100):
+    """
+    Verify pending payments oldest first, e.g. those left over by a restarted worker.
+
+    A payment whose verification raises is logged and left pending, so it cannot stop
+    the payments queued after it.
+
+    Returns:
+        list: The processed payments.
+    """
+    processed = []
+    pending = Payment.objects.filter(status="P").order_by("created")[:limit]
+    for payment in pending:
+        try:
+            processed.append(verify_payment(payment.pk))
+        except Exception:
+            logger.exception("Payment %s could not be processed", payment.pk)
+    return processed
@@ -0,0 +1,214 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+from orders.models import (
+    MenuSalesRollup,
+    MenuTypeSalesRollup,
+    Order,
+    OrderDetails,
+    OrderStateHistory,
+    SalesRollup,
+    cart_aggregates,
+)
+from orders.routers import replica_alias
+
+# Database functions truncating a timestamp to the start of each rollup period
+PERIOD_TRUNCATIONS = {
+    SalesRollup.HOUR: TruncHour,
+    SalesRollup.DAY: TruncDay,
+}
+
+
+def period_start(moment, period):
+    """
+    Get the start of the hour or day containing a moment, in the current time zone.
+
+    Args:
+        moment (datetime): An aware date and time.
+        period (str): SalesRollup.HOUR or SalesRollup.DAY.
+
+    Returns:
+        datetime: The aware start of the period, as TruncHour/TruncDay compute it.
+    """
+    start = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if period == SalesRollup.DAY:
+        start = start.replace(hour=0)
+    return start
+
+
+def paid_at(order_id):
+    """
+    Get when an order was paid, the moment its sales are bucketed by.
+
+    Args:
+        order_id (int): The paid order.
+
+    Returns:
+        datetime: The time of the order's transition to PAID, or the order date for
+        orders paid before state changes were recorded.
+    """
+    paid = (
+        OrderStateHistory.objects.filter(order_id=order_id, to_state=Order.PAID)
+        .values_list("created", flat=True)
+        .first()
+    )
+    return paid or Order.objects.values_list("date", flat=True).get(pk=order_id)
+
+
+def increment_rollup(model, key, revenue, orders, servings):
+    """
+    Add to the totals of a rollup row, creating the row if it does not exist yet.
+
+    Args:
+        model (Model): MenuSalesRollup or MenuTypeSalesRollup.
+        key (dict): The row's period, period_start and menu or menu type.
+        revenue (Decimal): The revenue to add (negative to subtract).
+        orders (int): The number of orders to add.
+        servings (int): The number of servings to add.
+    """
+    changes = {
+        "revenue": F("revenue") + revenue,
+        "orders": F("orders") + orders,
+        "servings": F("servings") + servings,
+    }
+    if model.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, revenue=revenue, orders=orders, servings=servings)
+    except IntegrityError:
+        # Another order created the row in the meantime
+        model.objects.filter(**key).update(**changes)
+
+
+def record_order_sales(order_id, sign=1):
+    """
+    Add a paid order to the sales rollups, or remove it again (sign=-1) when it is cancelled.
+
+    Sales are bucketed by the time the order was paid (see paid_at), so a cancellation
+    subtracts from the same rows, at the prices frozen when the order was finalized.
+
+    Args:
+        order_id (int): The paid order.
+        sign (int): 1 to add the order, -1 to subtract it.
+    """
+    lines = list(
+        OrderDetails.objects.filter(order_id=order_id, menu__isnull=False).select_related(
+            "menu"
+        )
+    )
+    if not lines:
+        return
+
+    by_menu = defaultdict(lambda: [0, 0])
+    by_type = defaultdict(lambda: [0, 0])
+    for line in lines:
+        for totals in (by_menu[line.menu_id], by_type[line.menu.type_id]):
+            totals[0] += line.total
+            totals[1] += line.no_of_serving
+
+    paid = paid_at(order_id)
+    with transaction.atomic():
+        for period in PERIOD_TRUNCATIONS:
+            start = period_start(paid, period)
+            for model, field, totals in (
+                (MenuSalesRollup, "menu_id", by_menu),
+                (MenuTypeSalesRollup, "menu_type_id", by_type),
+            ):
+                for pk, (revenue, servings) in totals.items():
+                    increment_rollup(
+                        model,
+                        {"period": period, "period_start": start, field: pk},
+                        sign * revenue,
+                        sign,
+                        sign * servings,
+                    )
+
+
+def rebuild_sales_rollups(start, end):
+    """
+    Re-aggregate the sales rollups of a date range from the lines of the orders paid in it.
+
+    The range is widened to whole days, so that every hourly and daily row in it is
+    replaced. Orders paid while the rebuild runs may be missed; run it off-peak.
+
+    Args:
+        start (datetime): The start of the range.
+        end (datetime): The end of the range (exclusive).
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    start = period_start(start, SalesRollup.DAY)
+    day_of_end = period_start(end, SalesRollup.DAY)
+    end = day_of_end if day_of_end == end else day_of_end + timedelta(days=1)
+
+    paid = OrderStateHistory.objects.filter(
+        order=OuterRef("order"), to_state=Order.PAID
+    ).values("created")[:1]
+    lines = OrderDetails.objects.annotate(
+        paid_at=Coalesce(Subquery(paid), "order__date")
+    ).filter(
+        order__state__in=Order.SOLD_STATES,
+        # Orders are paid after they are created, which narrows the scan by the date index
+        order__date__lt=end,
+        paid_at__gte=start,
+        paid_at__lt=end,
+        menu__isnull=False,
+    )
+    rollups = {MenuSalesRollup: [], MenuTypeSalesRollup: []}
+    for period, truncate in PERIOD_TRUNCATIONS.items():
+        for model, field, group in (
+            (MenuSalesRollup, "menu", "menu"),
+            (MenuTypeSalesRollup, "menu_type", "menu__type"),
+        ):
+            rows = (
+                lines.annotate(bucket=truncate("paid_at"))
+                .values("bucket", group)
+                .annotate(orders=Count("order", distinct=True), **cart_aggregates())
+                .order_by()
+            )
+            rollups[model].extend(
+                model(
+                    period=period,
+                    period_start=row["bucket"],
+                    revenue=row["cart_total_sum"],
+                    orders=row["orders"],
+                    servings=row["cart_items_sum"],
+                    **{f"{field}_id": row[group]},
+                )
+                for row in rows
+            )
+
+    with transaction.atomic():
+        for model, rows in rollups.items():
+            model.objects.filter(period_start__gte=start, period_start__lt=end).delete()
+            model.objects.bulk_create(rows)
+    return sum(len(rows) for rows in rollups.values())
+
+
+def sales_report(period, start, end, by="menu"):
+    """
+    Read sales per menu item or menu type from the rollups, for dashboards. The rollups
+    are read from a replica when one is configured.
+
+    Args:
+        period (str): SalesRollup.HOUR or SalesRollup.DAY.
+        start (datetime): The start of the range.
+        end (datetime): The end of the range (exclusive).
+        by (str): "menu" for menu items or "menu_type" for menu types.
+
+    Returns:
+        QuerySet: The rollup rows of the range, oldest first.
+    """
+    model = MenuSalesRollup if by == "menu" else MenuTypeSalesRollup
+    return (
+        model.objects.using(replica_alias())
+        .filter(period=period, period_start__gte=start, period_start__lt=end)
+        .select_related(by)
+        .order_by("period_start", f"{by}_id")
+    )
@@ -0,0 +1,91 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie telling later requests of a client that it wrote recently
+PIN_COOKIE = "pin_primary"
+
+# Models whose reads go to a replica during requests; a few seconds of replication
+# lag on the menu and the sales rollups are acceptable
+REPLICA_MODELS = {
+    "orders.menu",
+    "orders.menutype",
+    "orders.menusalesrollup",
+    "orders.menutypesalesrollup",
+}
+
+
+class RequestState:
+    """
+    Database routing state of the request being handled.
+
+    Attributes:
+        pinned (bool): The client wrote within REPLICA_PIN_SECONDS, so reads go to the
+            default database.
+        wrote (bool): The request wrote to the database.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# The state of the current request, None outside requests (commands, background jobs)
+request_state = ContextVar("request_state", default=None)
+
+
+def replica_alias():
+    """
+    Get the database to read from for queries that tolerate replication lag.
+
+    The default database is used when no replicas are configured, inside transactions
+    (which must see their own writes) and for clients that wrote recently.
+
+    Returns:
+        str: A replica's alias, picked at random, or the default alias.
+    """
+    state = request_state.get()
+    if (
+        not settings.DATABASE_REPLICAS
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        or (state is not None and (state.pinned or state.wrote))
+    ):
+        return DEFAULT_DB_ALIAS
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    """
+    Send reads of REPLICA_MODELS made while handling requests to a replica and every
+    other query to the default database.
+
+    Outside requests only code asking for replica_alias() explicitly (exports, sales
+    reports) reads from a replica, so commands and background jobs see their own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            request_state.get() is not None
+            and model._meta.label_lower in REPLICA_MODELS
+        ):
+            return replica_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.wrote = True
+        # Never fall back to the database an instance was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the default database
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from orders import workers
+from orders.cache import bump_menu_version
+from orders.cart import merge_session_cart
+from orders.images import process_menu_image
+from orders.kitchen import bump_kitchen_version
+from orders.middleware import count_queries
+from orders.models import Menu, MenuType, Order, order_state_changed
+from orders.reporting import record_order_sales
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+@receiver(post_save, sender=MenuType)
+@receiver(post_delete, sender=MenuType)
+def invalidate_menu_cache(sender, **kwargs):
+    """
+    Move to a new menu version whenever a menu item or menu type changes, once the
+    change is committed: a request reading the new version before then would cache the
+    old rows under it.
+    """
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_save, sender=Menu)
+def queue_menu_image_variants(sender, instance, **kwargs):
+    """
+    Generate the resized copies of a newly uploaded menu image in the background, and
+    delete those of a replaced or removed image.
+    """
+    if instance.image_variants.get("source", "") != (instance.image.name or ""):
+        transaction.on_commit(partial(workers.submit, process_menu_image, instance.pk))
+
+
+@receiver(order_state_changed, sender=Order)
+def notify_kitchen(sender, from_state, to_state, **kwargs):
+    """
+    Push the kitchen queue to connected screens when an order enters or leaves it.
+    """
+    if from_state in Order.KITCHEN_STATES or to_state in Order.KITCHEN_STATES:
+        transaction.on_commit(bump_kitchen_version)
+
+
+@receiver(order_state_changed, sender=Order)
+def update_sales_rollups(sender, order, from_state, to_state, **kwargs):
+    """
+    Add an order to the sales rollups once it is paid, and take it out again if it is cancelled.
+    """
+    if to_state == Order.PAID:
+        transaction.on_commit(partial(record_order_sales, order.pk))
+    elif to_state == Order.CANCELLED and from_state in Order.SOLD_STATES:
+        transaction.on_commit(partial(record_order_sales, order.pk, -1))
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """
+    Move the cart a visitor filled before signing in or up into their open order.
+    """
+    if request is not None and hasattr(request, "session"):
+        merge_session_cart(request, user)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Pass the queries of every new database connection to the counter of the request
+    being handled, see QueryInstrumentationMiddleware.
+    """
+    if count_queries not in connection.execute_wrappers:
+        # First, so wrappers pushed and popped by execute_wrapper() stay last
+        connection.execute_wrappers.insert(0, count_queries)
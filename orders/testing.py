@@ -0,0 +1,157 @@
+import unittest
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+# The tests' own cache, so they never read or clear the cache of a running server
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tests",
+    }
+}
+
+# A database of its own playing a read replica, for tests checking which database
+# queries go to; it is only created for tests listing it in their databases
+TEST_REPLICA = "replica"
+
+
+def explain_query_plan(queryset):
+    """
+    Get the SQLite query plan of a queryset.
+
+    Args:
+        queryset (QuerySet): The queryset to explain.
+
+    Returns:
+        list: The detail column of every step of the plan (e.g. "SEARCH menu USING INDEX ...").
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanMixin:
+    """
+    TestCase mixin with assertions on the query plans of querysets.
+    """
+
+    def assertNoFullScan(self, queryset, tables=None):
+        """
+        Fail if the queryset reads a table by scanning it instead of through an index.
+
+        Args:
+            queryset (QuerySet): The queryset to explain.
+            tables (iterable, optional): Only check these tables; defaults to every table.
+        """
+        if connections[queryset.db].vendor != "sqlite":
+            self.skipTest("Query plan checks run against SQLite only.")
+
+        plan = explain_query_plan(queryset)
+        full_scans = [
+            step
+            for step in plan
+            if step.startswith("SCAN ")
+            and " USING " not in step
+            and (tables is None or step.split()[1] in tables)
+        ]
+        if full_scans:
+            self.fail(
+                "Query regressed to a full table scan:\n"
+                + "\n".join(plan)
+                + f"\n\n{queryset.query}"
+            )
+
+    def assertNoTempSort(self, queryset):
+        """
+        Fail if the queryset sorts its rows in a temporary b-tree instead of reading an index in order.
+
+        Args:
+            queryset (QuerySet): The queryset to explain.
+        """
+        if connections[queryset.db].vendor != "sqlite":
+            self.skipTest("Query plan checks run against SQLite only.")
+
+        plan = explain_query_plan(queryset)
+        if any("USE TEMP B-TREE" in step for step in plan):
+            self.fail(
+                "Query sorts without an index:\n" + "\n".join(plan) + f"\n\n{queryset.query}"
+            )
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin with an upper bound on the number of queries a block may issue.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, num, using="default"):
+        """
+        Fail if the block issues more than `num` queries on the given database.
+
+        Args:
+            num (int): The query budget.
+            using (str): The database alias to watch.
+        """
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        executed = len(context.captured_queries)
+        if executed > num:
+            self.fail(
+                f"{executed} queries executed, budget is {num}:\n"
+                + "\n".join(
+                    f"{index}. {query['sql']}"
+                    for index, query in enumerate(context.captured_queries, start=1)
+                )
+            )
+
+
+class CacheIsolatingResult(unittest.TextTestResult):
+    """
+    Test result that empties the test cache before every test. Cached rows outlive the
+    database rollback between tests, and the next test may reuse their primary keys.
+    """
+
+    def startTest(self, test):
+        for cache in caches.all():
+            cache.clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that swaps the configured cache for TEST_CACHES during the test run,
+    starts every test with it empty and adds the TEST_REPLICA database.
+    """
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass()
+        if resultclass is None:
+            return CacheIsolatingResult
+        return type(resultclass.__name__, (CacheIsolatingResult, resultclass), {})
+
+    def setup_databases(self, **kwargs):
+        if TEST_REPLICA not in connections.settings:
+            default = connections.settings[DEFAULT_DB_ALIAS]
+            sqlite = default["ENGINE"].endswith("sqlite3")
+            connections.settings[TEST_REPLICA] = dict(
+                default,
+                TEST={"NAME": None if sqlite else f"test_{default['NAME']}_replica"},
+            )
+            connections.configure_settings(connections.settings)
+        return super().setup_databases(**kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_override = override_settings(CACHES=TEST_CACHES)
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        super().teardown_test_environment(**kwargs)
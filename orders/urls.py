@@ -1,11 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Serve the async order views when running under an ASGI server
+order_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path("", views.index, name="index"),
-    path("menu/", views.menu, name="menu"),
-    path("cart/", views.cart, name="cart"),
-    path("checkout/", views.checkout, name="checkout"),
-    path("update_item/", views.updateItem, name="update_item"),
-    path("proces_order/", views.procesOrder, name="proces_order"),
+    path("menu/", order_views.menu, name="menu"),
+    path("api/menu/", views.menuApi, name="menu_api"),
+    path("cart/", order_views.cart, name="cart"),
+    path("checkout/", order_views.checkout, name="checkout"),
+    path("cart_summary/", order_views.cartSummary, name="cart_summary"),
+    path("update_item/", order_views.updateItem, name="update_item"),
+    path("update_items/", order_views.updateItems, name="update_items"),
+    path("proces_order/", order_views.procesOrder, name="proces_order"),
+    path("payment_status/<str:key>/", views.paymentStatus, name="payment_status"),
+    path("kitchen/", views.kitchen, name="kitchen"),
+    path("kitchen/stream/", views.kitchenStream, name="kitchen_stream"),
+    path("kitchen/<int:order_id>/advance/", views.kitchenAdvance, name="kitchen_advance"),
+    path("orders/export/", views.exportOrders, name="export_orders"),
 ]
@@ -1,14 +1,245 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from orders.models import Menu, Order, OrderDetails
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.vary import vary_on_cookie
+from orders.cache import get_available_menu, get_menu_modified, get_menu_version
+from orders.exports import EXPORT_FORMATS, export_queryset, export_range, export_rows
+from orders.cart import (
+    MAX_CART_OPERATIONS,
+    CartLocked,
+    get_cart,
+    get_open_order,
+    update_cart,
+)
+from orders.kitchen import akitchen_events, kitchen_events, kitchen_snapshot
+from orders.models import InvalidStateTransition, Menu, Order, Payment
+from orders.payments import record_payment
+from datetime import date
+import hashlib
 import json
-import datetime
+
+
+def cart_state(order):
+    """
+    Serialize the stored cart totals of an order.
+
+    Args:
+        order (Order or SessionCart): The customer's open order or a visitor's session cart.
+
+    Returns:
+        dict: The number of items and the total cost of the cart.
+    """
+    return {"items": order.items_count, "total": str(order.total_amount)}
+
+
+def payment_state(payment):
+    """
+    Serialize the verification status of a payment.
+
+    Args:
+        payment (Payment): The payment.
+
+    Returns:
+        dict: The payment's idempotency key, status and amount.
+    """
+    return {
+        "payment": payment.idempotency_key,
+        "status": payment.get_status_display(),
+        "amount": str(payment.amount),
+    }
+
+
+def menu_page_context():
+    """
+    Build the template context of the menu page, shared by the sync and async views.
+
+    The menu is loaded lazily, only if the cached dish cards have to be rendered.
+    """
+    menu_version = get_menu_version()
+    return {
+        "menu": SimpleLazyObject(lambda: get_available_menu(menu_version)),
+        "menu_version": menu_version,
+        "menu_cache_timeout": settings.MENU_CACHE_TIMEOUT,
+        "cartItems": None,
+    }
+
+
+def cart_page_context(order, items):
+    """
+    Build the template context of the cart and checkout pages, shared by the sync and
+    async views.
+
+    Args:
+        order (Order or SessionCart): The customer's open order or a visitor's session cart.
+        items (iterable): The cart lines, with their dishes loaded.
+
+    Returns:
+        dict: The template context.
+    """
+    return {"items": items, "order": order, "cartItems": order.items_count}
+
+
+def json_body(request):
+    """
+    Parse the JSON object in a request body, shared by the sync and async views.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing JSON data.
+
+    Returns:
+        dict: The parsed object, empty if the body is not a JSON object.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def cart_action_operations(data):
+    """
+    Build the single cart operation of updateItem, shared by the sync and async views.
+
+    Args:
+        data (dict): The request's JSON object, see json_body.
+
+    Returns:
+        list: The cart operation, or None if the dish or the action is missing.
+    """
+    if "dishId" not in data or "action" not in data:
+        return None
+    return [{"dishId": data["dishId"], "action": data["action"]}]
+
+
+def cart_update_response(order, operations, single=False):
+    """
+    Apply cart operations and build the response of the cart update views, shared by
+    the sync and async views.
+
+    Args:
+        order (Order or SessionCart): The cart, as returned by get_cart.
+        operations (list): Cart operations as accepted by resolve_quantity.
+        single (bool): Whether this is the single operation of updateItem, answered
+            with the one updated line under "item".
+
+    Returns:
+        JsonResponse: The updated cart lines and the new cart totals, or an error
+        message with status 409 (order awaiting payment), 404 (unknown dish) or 400
+        (malformed operations).
+    """
+    try:
+        items = update_cart(order, operations)
+    except CartLocked as error:
+        return JsonResponse(str(error), status=409, safe=False)
+    except Menu.DoesNotExist:
+        return JsonResponse("Dish does not exist", status=404, safe=False)
+    except (KeyError, TypeError, ValueError):
+        message = "Invalid cart action" if single else "Invalid cart operations"
+        return JsonResponse(message, status=400, safe=False)
+
+    if single:
+        return JsonResponse({"item": items[0], "cart": cart_state(order)})
+    return JsonResponse({"items": items, "cart": cart_state(order)})
+
+
+def payment_response(order, reference, idempotency_key):
+    """
+    Record the payment of an order and build the response of the order processing
+    view, shared by the sync and async views.
+
+    Returns:
+        JsonResponse: The payment's state with status 202, or an error message with
+        status 400 if the payment cannot be recorded.
+    """
+    try:
+        payment = record_payment(order, str(reference), str(idempotency_key))
+    except ValueError as error:
+        return JsonResponse(str(error), status=400, safe=False)
+
+    return JsonResponse(payment_state(payment), status=202)
+
+
+def menu_etag(request):
+    """
+    Compute the ETag of the menu page from everything it is rendered from: the menu
+    version, the static files release and the user shown in the navigation bar.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with request.user loaded.
+
+    Returns:
+        str: A weak ETag.
+    """
+    user = request.user
+    parts = (
+        get_menu_version(),
+        getattr(staticfiles_storage, "manifest_hash", ""),
+        user.pk,
+        user.get_username(),
+        user.is_staff,
+    )
+    return f'W/"menu-{hashlib.sha1(repr(parts).encode()).hexdigest()[:20]}"'
+
+
+def menu_last_modified(request):
+    """
+    Get when the menu page last changed: the last menu change, or the user's last
+    sign-in if that was later.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with request.user loaded.
+
+    Returns:
+        datetime: The time of the last change.
+    """
+    modified = get_menu_modified()
+    last_login = getattr(request.user, "last_login", None)
+    return max(modified, last_login) if last_login else modified
+
+
+def menu_api_etag(request):
+    """
+    Compute the ETag of the menu JSON endpoint from the menu version.
+    """
+    return f'"menu-api-{get_menu_version()}"'
+
+
+def menu_item_state(dish):
+    """
+    Serialize an available menu item for the menu JSON endpoint.
+
+    Args:
+        dish (Menu): The menu item, with its type loaded.
+
+    Returns:
+        dict: The item's id, name, type, price, ingredients, image URL and srcsets of
+        the resized copies of the image per format.
+    """
+    return {
+        "id": dish.pk,
+        "name": dish.name,
+        "type": dish.type.name,
+        "price": str(dish.price),
+        "ingredients": dish.ingredients,
+        "image": dish.image_url or None,
+        "srcset": {
+            image_format: dish.image_srcset(image_format)
+            for image_format in ("fallback", "webp", "avif")
+        },
+    }
 
 
 def index(request):
     """
-    Display the index page, including the user's shopping cart information if authenticated.
+    Display the index page, including the number of items in the shopping cart.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -17,24 +248,28 @@ def index(request):
         HttpResponse: Renders the 'orders/index.html' template with the appropriate context.
     """
 
-    if request.user.is_authenticated:
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(
-            customer=customer.username, status=False
-        )
-        cartItems = order.cart_items
-    else:
-        order = {"get_cart_total": 0, "get_cart_items": 0}
-        cartItems = []
+    cartItems = get_cart(request).items_count
 
     context = {"menu": menu, "cartItems": cartItems}
     return render(request, "orders/index.html", context)
 
 
+# Browsers revalidate the page on every visit and get a 304 without the page being
+# rendered while neither the menu nor the user changed. Anonymous visitors post cart
+# updates too, so they need the CSRF cookie
+@ensure_csrf_cookie
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
+@condition(etag_func=menu_etag, last_modified_func=menu_last_modified)
 def menu(request):
     """
     Display the menu page, including menu items and the user's shopping cart information if authenticated.
 
+    The dish cards are cached as a rendered fragment keyed by the menu version, so the menu
+    itself is only loaded when that fragment has to be rendered. The cart badge is left out of
+    the page and filled in by cart.js from the cart_summary endpoint. Requests revalidating
+    an unchanged page are answered with 304 Not Modified (see menu_etag).
+
     Args:
         request (HttpRequest): The HTTP request object.
 
@@ -42,26 +277,53 @@ def menu(request):
         HttpResponse: Renders the 'orders/menu.html' template with the appropriate context.
     """
 
-    menu = Menu.objects.filter(status="A").order_by("type", "price")
+    return render(request, "orders/menu.html", menu_page_context())
 
-    if request.user.is_authenticated:
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(
-            customer=customer.username, status=False
-        )
-        cartItems = order.cart_items
-    else:
-        order = {"get_cart_total": 0, "get_cart_items": 0}
-        cartItems = []
 
-    context = {"menu": menu, "cartItems": cartItems}
-    return render(request, "orders/menu.html", context)
+@cache_control(public=True, max_age=settings.MENU_API_MAX_AGE, stale_while_revalidate=300)
+@condition(etag_func=menu_api_etag, last_modified_func=lambda request: get_menu_modified())
+def menuApi(request):
+    """
+    Return the available menu items as JSON, for mobile clients and for CDNs or reverse
+    proxies to cache.
 
+    The response does not depend on the user or the session, so it is public; clients
+    revalidate it with the ETag or Last-Modified validators and get 304 Not Modified
+    while the menu is unchanged.
 
-@login_required(login_url="signin")
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: JSON response with the menu version and the menu items.
+    """
+    menu_version = get_menu_version()
+    data = {
+        "version": menu_version,
+        "items": [menu_item_state(dish) for dish in get_available_menu(menu_version)],
+    }
+    return JsonResponse(data)
+
+
+def cartSummary(request):
+    """
+    Return the number of items and the total cost of the user's shopping cart, or of the
+    session cart of an anonymous visitor.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: JSON response with the cart item count and total.
+    """
+
+    return JsonResponse(cart_state(get_cart(request)))
+
+
+@ensure_csrf_cookie
 def cart(request):
     """
-    Display the user's shopping cart, including the cart items and order details if authenticated.
+    Display the shopping cart of the user, or the session cart of an anonymous visitor.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -70,26 +332,19 @@ def cart(request):
         HttpResponse: Renders the 'orders/cart.html' template with the appropriate context.
     """
 
+    order = get_cart(request)
     if request.user.is_authenticated:
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(
-            customer=customer.username, status=False
-        )
-        cartItems = order.cart_items
-        items = order.order_details.all()
+        items = order.order_details.select_related("menu")
     else:
-        items = []
-        order = {"get_cart_total": 0, "get_cart_items": 0}
-        cartItems = []
+        items = order.lines()
 
-    context = {"items": items, "order": order, "cartItems": cartItems}
-    return render(request, "orders/cart.html", context)
+    return render(request, "orders/cart.html", cart_page_context(order, items))
 
 
 @login_required(login_url="signin")
 def checkout(request):
     """
-    Display the checkout page, including the user's shopping cart and order details if authenticated.
+    Display the checkout page, including the user's shopping cart and order details.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -98,83 +353,188 @@ def checkout(request):
         HttpResponse: Renders the 'orders/checkout.html' template with the appropriate context.
     """
 
-    if request.user.is_authenticated:
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(
-            customer=customer.username, status=False
-        )
-        cartItems = order.cart_items
-        items = order.order_details.all()
-    else:
-        items = []
-        order = {"get_cart_total": 0, "get_cart_items": 0}
-        cartItems = []
-
-    context = {"items": items, "order": order, "cartItems": cartItems}
-    return render(request, "orders/checkout.html", context)
+    order = get_open_order(request)
+    items = order.order_details.select_related("menu")
+    return render(request, "orders/checkout.html", cart_page_context(order, items))
 
 
-@login_required(login_url="signin")
 def updateItem(request):
     """
-    Handle updates to items in the user's shopping cart based on the provided action.
+    Handle updates to items in the shopping cart based on the provided action. Anonymous
+    visitors update their session cart.
 
     Args:
         request (HttpRequest): The HTTP request object containing JSON data.
 
     Returns:
-        JsonResponse: JSON response indicating the result of the update.
+        JsonResponse: JSON response with the updated cart line (quantity and line total)
+        and the new cart totals, so the page can be patched without reloading, or status
+        400 if the body is not a JSON object with "dishId" and "action".
     """
-    data = json.loads(request.body)
-    dishId = data["dishId"]
-    action = data["action"]
+    operations = cart_action_operations(json_body(request))
+    if operations is None:
+        return JsonResponse("Invalid cart action", status=400, safe=False)
 
-    customer = request.user.customer
-    dish = Menu.objects.get(id=dishId)
-    order, created = Order.objects.get_or_create(
-        customer=customer.username, status=False
-    )
-    orderItem, created = OrderDetails.objects.get_or_create(order=order, menu=dish)
+    return cart_update_response(get_cart(request), operations, single=True)
 
-    if action == "add":
-        orderItem.no_of_serving += 1
-    elif action == "remove":
-        orderItem.no_of_serving -= 1
-    elif action == "delete":
-        orderItem.no_of_serving = 0
 
-    orderItem.save()
+def updateItems(request):
+    """
+    Apply a batch of updates to items in the shopping cart in one transaction. Anonymous
+    visitors update their session cart.
 
-    if orderItem.no_of_serving <= 0:
-        orderItem.delete()
+    The request body holds {"operations": [...]}, where each operation is either
+    {"dishId", "action"} or {"dishId", "quantity"}.
 
-    return JsonResponse("Item was updated", safe=False)
+    Args:
+        request (HttpRequest): The HTTP request object containing JSON data.
+
+    Returns:
+        JsonResponse: JSON response with every updated cart line and the new cart totals.
+    """
+    operations = json_body(request).get("operations")
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_CART_OPERATIONS:
+        return JsonResponse("Invalid cart operations", status=400, safe=False)
+
+    return cart_update_response(get_cart(request), operations)
 
 
 @login_required(login_url="signin")
 def procesOrder(request):
     """
-    Process the user's order and mark it as paid if the total matches.
+    Record the payment of the user's order and queue its verification.
+
+    The request body holds the gateway's payment reference ("paymentId") and a
+    client-generated "idempotencyKey". The amount due is computed server-side; the order
+    is marked as paid by a background worker once the gateway confirms the payment.
 
     Args:
         request (HttpRequest): The HTTP request object containing JSON data.
 
     Returns:
-        JsonResponse: JSON response indicating the result of the order processing.
+        JsonResponse: JSON response with the payment's idempotency key and status.
     """
-    transaction_id = datetime.datetime.now().timestamp()
-    data = json.loads(request.body)
+    data = json_body(request)
+    reference = data.get("paymentId")
+    idempotency_key = data.get("idempotencyKey")
+    if not reference or not idempotency_key:
+        return JsonResponse("Missing payment details", status=400, safe=False)
+
+    return payment_response(get_open_order(request), reference, idempotency_key)
 
-    if request.user.is_authenticated:
-        customer = request.user.customer_table
-        order, created = Order.objects.get_or_create(
-            customer_id=customer.customer_username, order_status=False
-        )
-        total = float(data["form"]["total"])
-        order.transaction_id = transaction_id
 
-        if total == float(order.get_cart_total()):
-            order.order_status = True
-        order.save()
+@login_required(login_url="signin")
+def paymentStatus(request, key):
+    """
+    Return the verification status of one of the user's payments.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        key (str): The payment's idempotency key.
 
-    return JsonResponse("Payment complete!", safe=False)
+    Returns:
+        JsonResponse: JSON response with the payment's idempotency key and status.
+    """
+    payment = get_object_or_404(Payment, idempotency_key=key, order__customer=request.user)
+    return JsonResponse(payment_state(payment))
+
+
+@staff_member_required
+def kitchen(request):
+    """
+    Display the kitchen screen with the queue of paid orders, kept up to date by kitchenStream.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: Renders the 'orders/kitchen.html' template with the current queue.
+    """
+    context = {"queue": kitchen_snapshot()}
+    return render(request, "orders/kitchen.html", context)
+
+
+@staff_member_required
+async def kitchenStream(request):
+    """
+    Stream the kitchen queue to a screen as Server-Sent Events. Prefer an ASGI server,
+    where an open stream does not hold a worker thread; WSGI servers get a blocking
+    stream, as they would collect an async one into memory before sending anything.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        StreamingHttpResponse: An endless text/event-stream response.
+    """
+    events = akitchen_events if isinstance(request, ASGIRequest) else kitchen_events
+    response = StreamingHttpResponse(
+        events(request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@staff_member_required
+@require_POST
+def kitchenAdvance(request, order_id):
+    """
+    Move an order in the kitchen queue to its next state, e.g. from paid to preparing.
+
+    The request body holds {"state": ...} with the new state.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing JSON data.
+        order_id (int): The order to move.
+
+    Returns:
+        JsonResponse: JSON response with the order id and its new state, status 400 if
+        the state is missing or status 409 if the order cannot move to that state.
+    """
+    state = json_body(request).get("state")
+    if not state:
+        return JsonResponse("Missing order state", status=400, safe=False)
+    order = get_object_or_404(Order, pk=order_id)
+    try:
+        order.transition_to(state, user=request.user)
+    except InvalidStateTransition as error:
+        return JsonResponse(str(error), status=409, safe=False)
+
+    return JsonResponse({"order": order.pk, "state": order.state})
+
+
+@staff_member_required
+def exportOrders(request):
+    """
+    Stream the order history as CSV or JSON Lines, one row per order line.
+
+    The query string may hold format ("csv" or "jsonl"), start and end (inclusive
+    YYYY-MM-DD days of the order date).
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        StreamingHttpResponse: The export as a file download, or a JsonResponse with
+        status 400 for an unknown format or malformed date.
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse("Unknown export format", status=400, safe=False)
+    try:
+        start, end = (
+            date.fromisoformat(request.GET[name]) if request.GET.get(name) else None
+            for name in ("start", "end")
+        )
+    except ValueError:
+        return JsonResponse("Invalid date", status=400, safe=False)
+
+    lines, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        lines(export_rows(export_queryset(*export_range(start, end)))),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="orders.{export_format}"'
+    return response
@@ -0,0 +1,52 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Get the process-wide thread pool running background jobs, creating it on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix="orders-worker",
+            )
+            atexit.register(_executor.shutdown)
+        return _executor
+
+
+def run_job(func, *args):
+    """
+    Run a background job, logging failures and releasing the thread's database connections.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception("Background job %s failed", func.__name__)
+    finally:
+        connections.close_all()
+
+
+def submit(func, *args):
+    """
+    Run `func(*args)` in the background thread pool.
+
+    With settings.BACKGROUND_WORKERS set to 0 the job runs inline instead, which keeps
+    tests and management commands deterministic.
+    """
+    if not settings.BACKGROUND_WORKERS:
+        return func(*args)
+    return get_executor().submit(run_job, func, *args)
@@ -6,20 +6,54 @@ updateButtons.forEach((button) => {
     button.addEventListener('click', handleUpdateClick);
 });
 
+// Fill in the cart badge of pages rendered without it
+const cartBadge = document.getElementById('cart-items');
+
+if (cartBadge && cartBadge.hasAttribute('data-deferred')) {
+    refreshCartBadge();
+}
+
+function refreshCartBadge() {
+    fetch('/cart_summary/')
+    .then((response) => (response.ok ? response.json() : null))
+    .then((data) => {
+        // Keep the badge as rendered if the summary could not be loaded
+        if (data) {
+            cartBadge.textContent = data.items;
+        }
+    });
+}
+
 function handleUpdateClick(event) {
     const dishId = event.target.dataset.dish;
     const action = event.target.dataset.action;
 
-    if (user === 'AnonymousUser') {
-        console.log('Not logged');
-    } else {
-        updateUserOrder(dishId, action);
-    }
+    // Anonymous visitors fill a session cart, merged into their order when they sign in
+    updateUserOrder(dishId, action);
 }
 
+// Clicks within this window are sent to the server as one batch
+const BATCH_WINDOW_MS = 300;
+let pendingOperations = [];
+let flushTimer = null;
+
 function updateUserOrder(dishId, action) {
-    console.log('Logged');
-    const url = '/update_item/';
+    if (action === 'delete') {
+        // Deleting a dish makes earlier queued clicks on it irrelevant
+        pendingOperations = pendingOperations.filter((operation) => operation.dishId !== dishId);
+    }
+    pendingOperations.push({ dishId, action });
+
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flushCartOperations, BATCH_WINDOW_MS);
+}
+
+function flushCartOperations() {
+    const operations = pendingOperations;
+    const url = '/update_items/';
+
+    pendingOperations = [];
+    flushTimer = null;
 
     fetch(url, {
         method: 'POST',
@@ -27,11 +61,48 @@ function updateUserOrder(dishId, action) {
         'Content-Type': 'application/json',
         'X-CSRFToken': csrftoken,
         },
-        body: JSON.stringify({ dishId, action }),
+        body: JSON.stringify({ operations }),
     })
-    .then((response) => response.json())
-    .then((data) => {
-        console.log('Data:', data);
-        location.reload();
+    .then((response) => response.json().then((data) => {
+        if (!response.ok) {
+            // The batch was rejected as a whole (e.g. the order is being paid for),
+            // so the page still shows the cart as stored; the body is the error message
+            alert(data);
+            if (cartBadge) {
+                refreshCartBadge();
+            }
+            return;
+        }
+        renderCartState(data);
+    }));
+}
+
+// Patch the updated cart lines and the cart totals in place
+function renderCartState(data) {
+    data.items.forEach((item) => {
+        const row = document.querySelector(`[data-dish-row="${item.dishId}"]`);
+
+        if (!row) {
+            return;
+        }
+        if (item.quantity > 0) {
+            row.querySelector('.line-quantity').textContent = item.quantity;
+            row.querySelector('.line-total').textContent = parseFloat(item.total).toFixed(2);
+        } else {
+            row.remove();
+        }
     });
-}
\ No newline at end of file
+
+    const summaryItems = document.getElementById('cart-summary-items');
+    const summaryTotal = document.getElementById('cart-summary-total');
+
+    if (summaryItems) {
+        summaryItems.textContent = data.cart.items;
+    }
+    if (summaryTotal) {
+        summaryTotal.textContent = parseFloat(data.cart.total).toFixed(2);
+    }
+    if (cartBadge) {
+        cartBadge.textContent = data.cart.items;
+    }
+}
@@ -0,0 +1,13 @@
+from django.contrib.auth.backends import ModelBackend
+from users.cache import get_cached_user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Authentication backend loading the user of each authenticated request from the
+    cache instead of the database. Cached users are invalidated when they are saved.
+    """
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if self.user_can_authenticate(user) else None
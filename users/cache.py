@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+USER_KEY = "users:user:{user_id}"
+
+
+def user_cache():
+    """
+    Get the Django cache backend holding users.
+    """
+    return caches[getattr(settings, "USER_CACHE_ALIAS", "default")]
+
+
+def get_cached_user(user_id):
+    """
+    Get a user by primary key, from the cache when possible.
+
+    Args:
+        user_id (int): The user's primary key.
+
+    Returns:
+        User: The user, or None if there is no such user.
+    """
+    cache = user_cache()
+    key = USER_KEY.format(user_id=user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model()._default_manager.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, getattr(settings, "USER_CACHE_TIMEOUT", 3600))
+    return user
+
+
+def invalidate_user(user_id):
+    """
+    Remove a user from the cache.
+    """
+    user_cache().delete(USER_KEY.format(user_id=user_id))
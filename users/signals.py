@@ -0,0 +1,14 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.cache import invalidate_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Remove a changed user from the cache, e.g. after a password change or login.
+    """
+    invalidate_user(instance.pk)
+
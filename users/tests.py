@@ -1,3 +1,66 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.models import Customer
 
-# For this project, test are created only for "orders" application
+
+class UserCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.customer = Customer.objects.create(
+            username=self.user,
+            phone_number="123456789",
+            postal_code="00-001",
+            city="Warsaw",
+            street="Main",
+            number="1",
+        )
+
+    def auth_queries(self, url):
+        """
+        Request a page and get the queries it made on sessions, users and customers.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        tables = ('"django_session"', '"auth_user"', '"customers"')
+        return [
+            query["sql"]
+            for query in queries.captured_queries
+            if any(table in query["sql"] for table in tables)
+        ]
+
+    def test_warm_cache_requests_make_no_auth_queries(self):
+        self.client.login(username="testuser", password="testpassword")
+        self.client.get(reverse("checkout"))
+
+        self.assertEqual(self.auth_queries(reverse("menu")), [])
+        self.assertEqual(self.auth_queries(reverse("checkout")), [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_signed_cookie_sessions(self):
+        self.client.login(username="testuser", password="testpassword")
+        self.client.get(reverse("menu"))
+
+        self.assertEqual(self.auth_queries(reverse("menu")), [])
+        self.assertFalse(Session.objects.exists())
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.login(username="testuser", password="testpassword")
+        self.client.get(reverse("menu"))
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse("cart"))
+
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_sessions_of_the_model_backend_stay_valid(self):
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+
+        response = self.client.get(reverse("cart"))
+
+        self.assertEqual(response.wsgi_request.user, self.user)
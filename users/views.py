@@ -1,5 +1,5 @@
 from django.shortcuts import redirect, render
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from users.models import Customer
 from users.forms import SignUpForm, AddressForm
@@ -13,8 +13,8 @@ def signup(request):
         request (HttpRequest): The HTTP request object.
 
     Returns:
-        HttpResponse: Redirects to the 'index' page upon successful signup or
-        renders the signup form if the request method is not POST.
+        HttpResponse: Signs the new user in and redirects to the 'index' page upon
+        successful signup or renders the signup form if the request method is not POST.
     """
 
     if request.method == "POST":
@@ -31,6 +31,8 @@ def signup(request):
                 street=address_data["street"],
                 number=address_data["number"],
             )
+            # Sign the new customer in, which also takes over their session cart
+            login(request, user, backend="users.backends.CachedModelBackend")
             return redirect("index")
     else:
         formset = SignUpForm()
@@ -55,12 +57,9 @@ def signin(request):
     if request.method == "POST":
         formset = AuthenticationForm(data=request.POST)
         if formset.is_valid():
-            username = request.POST["username"]
-            password = request.POST["password"]
-            user = authenticate(request, username=username, password=password)
-            if user is not None:
-                login(request, user)
-                return redirect("index")
+            # The form already authenticated the user; logging in merges their session cart
+            login(request, formset.get_user())
+            return redirect("index")
     else:
         formset = AuthenticationForm()
 